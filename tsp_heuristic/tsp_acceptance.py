@@ -0,0 +1,110 @@
+# -*- coding: utf-8 -*-
+"""Acceptance criteria of the iterated local search and the strength of
+localized double-bridge kicks.
+
+'better' only moves to strictly shorter local optima (the classic ILS),
+'better-equal' also to equally long ones, 'annealing' accepts a longer one
+with probability exp(-delta / temperature) under geometric cooling, and
+'restart' is 'better' with a fresh random start after RESTART_ITERATIONS
+iterations without an improvement of the current solution. Random draws
+come from the random module, so checkpoints reproduce them.
+"""
+
+import math
+import random
+
+ACCEPTANCE_RULES = ('better', 'better-equal', 'annealing', 'restart')
+KICKS = ('random', 'local')
+# start temperature relative to the mean edge length of the first tour
+ANNEALING_TEMPERATURE = 0.5
+# temperature factor per iteration
+ANNEALING_COOLING = 0.995
+RESTART_ITERATIONS = 200
+
+# localized kicks cut the tour next to a random city and 3 of its
+# strength nearest neighbors, strength stays within KICK_MIN..KICK_MAX
+KICK_MIN = 4
+KICK_MAX = 64
+KICK_START = 8
+# kicks between two adaptations of the strength
+KICK_WINDOW = 50
+# share of improving kicks below which the strength grows and above which it shrinks
+KICK_LOW_RATE = 0.02
+KICK_HIGH_RATE = 0.1
+KICK_GROWTH = 1.5
+
+
+class Acceptance(object):
+    """Decides whether a new local optimum replaces the current solution"""
+
+    def __init__(self, rule='better', dimension=1):
+        if rule not in ACCEPTANCE_RULES:
+            raise ValueError("Unknown acceptance rule '{0}', use one of {1}".format(rule, ACCEPTANCE_RULES))
+        self.rule = rule
+        self.dimension = dimension
+        self.temperature = None
+        # iterations since the current solution last improved
+        self.idle = 0
+
+    def accept(self, candidate, current):
+        """candidate and current are tour lengths"""
+        if candidate < current:
+            self.idle = 0
+            return True
+        self.idle += 1
+        if self.rule == 'better-equal':
+            return candidate == current
+        if self.rule == 'annealing':
+            if self.temperature is None:
+                self.temperature = ANNEALING_TEMPERATURE * current / float(self.dimension)
+            self.temperature *= ANNEALING_COOLING
+            if self.temperature <= 0:
+                return False
+            return random.random() < math.exp(-(candidate - current) / self.temperature)
+        return False
+
+    def restart(self):
+        """True when the search should continue from a new start tour"""
+        if self.rule != 'restart' or self.idle < RESTART_ITERATIONS:
+            return False
+        self.idle = 0
+        return True
+
+    def state(self):
+        return {'temperature': self.temperature, 'idle': self.idle}
+
+    def restore(self, state):
+        self.temperature = state['temperature']
+        self.idle = state['idle']
+
+
+class KickStrength(object):
+    """Neighborhood size of localized kicks. Every KICK_WINDOW kicks it grows
+    if too few of them led to a better current solution (the kicks do not
+    escape the local optimum) and shrinks if many did (cheaper kicks do)."""
+
+    def __init__(self, strength=KICK_START):
+        self.strength = strength
+        self.kicks = 0
+        self.successes = 0
+
+    def record(self, improved):
+        self.kicks += 1
+        self.successes += improved
+        if self.kicks < KICK_WINDOW:
+            return
+        rate = self.successes / float(self.kicks)
+        if rate < KICK_LOW_RATE:
+            self.strength = min(KICK_MAX, int(math.ceil(self.strength * KICK_GROWTH)))
+        elif rate > KICK_HIGH_RATE:
+            self.strength = max(KICK_MIN, int(self.strength / KICK_GROWTH))
+        self.kicks = 0
+        self.successes = 0
+
+    def state(self):
+        return {'strength': self.strength, 'kicks': self.kicks, 'successes': self.successes}
+
+    def restore(self, state):
+        self.strength = state['strength']
+        self.kicks = state['kicks']
+        self.successes = state['successes']
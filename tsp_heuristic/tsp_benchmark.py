@@ -0,0 +1,193 @@
+# -*- coding: utf-8 -*-
+"""Benchmark the solver on every instance with a known optimal tour.
+
+    python tsp_benchmark.py --seeds 1 2 3 --budgets 1 5 -k 10
+    python tsp_benchmark.py --seeds 1 2 3 --budgets 1 5 -k 10 --compare ../log/benchmark/baseline.json
+
+Every run records the optimality gap, the time to reach target-gap, the
+iterations per second and the local search moves per second. Results are
+written as JSON and CSV to log/benchmark/. With --compare the summary is
+checked against a stored baseline and the exit code is 1 on regressions.
+"""
+
+import os
+import sys
+import json
+import argparse
+from datetime import datetime
+
+from tsp_solver import Solver, ROOT_DIR
+from tsp_parser import read_tour
+from tsp_cli import PROBLEMS_DIR
+from tsp_localsearch import LOCAL_SEARCH_MODES
+from tsp_construct import STARTERS
+from tsp_acceptance import ACCEPTANCE_RULES, KICKS
+from tsp_runstore import engine_name, time_to_target
+
+OPT_DIR = os.path.join(PROBLEMS_DIR, 'opt')
+BENCHMARK_DIR = os.path.join(ROOT_DIR, 'log', 'benchmark')
+# runs are bounded by their time budget, this only guards against endless runs
+ITERATION_CAP = 10 ** 9
+RECORD_FIELDS = ['instance', 'engine', 'budget', 'seed', 'optimum', 'distance', 'gap', 'time-to-target',
+                 'iterations', 'runtime', 'iterations-per-second', 'moves-evaluated', 'moves-per-second']
+SUMMARY_FIELDS = ['instance', 'engine', 'budget', 'runs', 'gap-mean', 'gap-best', 'target-reached',
+                  'time-to-target-mean', 'iterations-per-second', 'moves-per-second']
+
+
+def collect_benchmarks():
+    """instances in problems/ that have an optimal tour in problems/opt/"""
+    for file in sorted(os.listdir(OPT_DIR)):
+        if file.endswith('.opt.tour'):
+            name = file[:-len('.opt.tour')]
+            if os.path.isfile(os.path.join(PROBLEMS_DIR, name + '.tsp')):
+                yield name
+
+
+def run_benchmark(instances, seeds, budgets, args):
+    records = []
+    for name in instances:
+        solver = Solver(os.path.join(PROBLEMS_DIR, name + '.tsp'))
+        solver.write_log = False
+        solver.setParameters(ITERATION_CAP, args.alternative, args.idle_limit, neighbor_k=args.neighbors,
+                             local_search_mode=args.local_search, starter=args.starter,
+                             acceptance=args.acceptance, kick=args.kick,
+                             alt_batch=args.alt_batch, alt_pick=args.alt_pick)
+        engine = engine_name(solver.parameters())
+        solver.prepare()
+        optimum = solver.calculate_tour_distance(read_tour(os.path.join(OPT_DIR, name + '.opt.tour')))
+        target = optimum * (1 + args.target_gap / 100.0)
+        for budget in budgets:
+            for seed in seeds:
+                solver.setParameters(ITERATION_CAP, args.alternative, args.idle_limit,
+                                     neighbor_k=args.neighbors, seed=seed, time_limit=budget,
+                                     local_search_mode=args.local_search, starter=args.starter,
+                                     acceptance=args.acceptance, kick=args.kick,
+                                     alt_batch=args.alt_batch, alt_pick=args.alt_pick)
+                best = solver.solve()
+                runtime = solver.runtime.total_seconds()
+                record = {'instance': name,
+                          'engine': engine,
+                          'budget': budget,
+                          'seed': seed,
+                          'optimum': optimum,
+                          'distance': best['distance'],
+                          'gap': 100.0 * (best['distance'] - optimum) / optimum,
+                          'time-to-target': time_to_target(solver.improvements, target),
+                          'iterations': solver.iterations,
+                          'runtime': runtime,
+                          'iterations-per-second': solver.iterations / runtime,
+                          'moves-evaluated': solver.moves_evaluated,
+                          'moves-per-second': solver.moves_evaluated / runtime}
+                records.append(record)
+                print "{instance} {engine} budget {budget}s seed {seed}: gap {gap:.2f}% " \
+                      "{iterations-per-second:.1f} it/s {moves-per-second:.0f} moves/s".format(**record)
+    return records
+
+
+def mean(values):
+    return sum(values) / float(len(values)) if values else None
+
+
+def summarize(records):
+    groups = {}
+    for record in records:
+        groups.setdefault((record['instance'], record['engine'], record['budget']), []).append(record)
+    summary = []
+    for (instance, engine, budget), runs in sorted(groups.items()):
+        reached = [run['time-to-target'] for run in runs if run['time-to-target'] is not None]
+        summary.append({'instance': instance,
+                        'engine': engine,
+                        'budget': budget,
+                        'runs': len(runs),
+                        'gap-mean': mean([run['gap'] for run in runs]),
+                        'gap-best': min(run['gap'] for run in runs),
+                        'target-reached': len(reached) / float(len(runs)),
+                        'time-to-target-mean': mean(reached),
+                        'iterations-per-second': mean([run['iterations-per-second'] for run in runs]),
+                        'moves-per-second': mean([run['moves-per-second'] for run in runs])})
+    return summary
+
+
+def compare(summary, baseline, gap_tolerance, throughput_tolerance):
+    """regressions of summary against the summary of a baseline benchmark"""
+    reference = dict(((s['instance'], s['engine'], s['budget']), s) for s in baseline['summary'])
+    regressions = []
+    for current in summary:
+        key = (current['instance'], current['engine'], current['budget'])
+        if key not in reference:
+            continue
+        old = reference[key]
+        if current['gap-mean'] > old['gap-mean'] + gap_tolerance:
+            regressions.append("{0} {1} {2}s: gap {3:.2f}% -> {4:.2f}%".format(
+                key[0], key[1], key[2], old['gap-mean'], current['gap-mean']))
+        for field in ('iterations-per-second', 'moves-per-second'):
+            if old[field] and current[field] < old[field] * (1 - throughput_tolerance):
+                regressions.append("{0} {1} {2}s: {3} {4:.1f} -> {5:.1f}".format(
+                    key[0], key[1], key[2], field, old[field], current[field]))
+    return regressions
+
+
+def write_results(path, records, summary, args):
+    directory = os.path.dirname(path)
+    if directory and not os.path.isdir(directory):
+        os.makedirs(directory)
+    with open(path + '.json', 'w') as f:
+        json.dump({'timestamp': str(datetime.now()),
+                   'arguments': vars(args),
+                   'records': records,
+                   'summary': summary}, f, indent=2, sort_keys=True)
+    with open(path + '.csv', 'w') as f:
+        f.write(";".join(RECORD_FIELDS) + '\n')
+        for record in records:
+            f.write(";".join(str(record[field]) for field in RECORD_FIELDS) + '\n')
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description="Benchmark against the optimal tours in problems/opt/")
+    parser.add_argument('instances', nargs='*', help="default: every instance with an optimal tour")
+    parser.add_argument('--seeds', type=int, nargs='+', default=[1, 2, 3])
+    parser.add_argument('--budgets', type=float, nargs='+', default=[1.0, 5.0], help="time budgets in seconds")
+    parser.add_argument('--target-gap', type=float, default=1.0, help="gap in percent for time-to-target")
+    parser.add_argument('--alternative', action='store_true', help="random 2-opt with an idle limit")
+    parser.add_argument('--idle-limit', type=int, default=100)
+    parser.add_argument('--alt-batch', type=int, default=1)
+    parser.add_argument('--alt-pick', choices=('best', 'first'), default='best')
+    parser.add_argument('-l', '--local-search', choices=LOCAL_SEARCH_MODES, default='2opt')
+    parser.add_argument('--starter', choices=STARTERS, default='random')
+    parser.add_argument('--acceptance', choices=ACCEPTANCE_RULES, default='better')
+    parser.add_argument('--kick', choices=KICKS, default='random')
+    parser.add_argument('-k', '--neighbors', type=int, default=0, help="candidate neighbors per city, 0 = all")
+    parser.add_argument('-o', '--output', default=None,
+                        help="output path without extension, default: log/benchmark/<timestamp>")
+    parser.add_argument('--compare', default=None, help="baseline JSON to check for regressions")
+    parser.add_argument('--gap-tolerance', type=float, default=0.5,
+                        help="allowed increase of the mean gap in percentage points")
+    parser.add_argument('--throughput-tolerance', type=float, default=0.2,
+                        help="allowed relative drop of iterations and moves per second")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(sys.argv[1:] if argv is None else argv)
+    instances = args.instances or list(collect_benchmarks())
+    records = run_benchmark(instances, args.seeds, args.budgets, args)
+    summary = summarize(records)
+
+    output = args.output or os.path.join(BENCHMARK_DIR, datetime.now().strftime('%Y%m%d-%H%M%S'))
+    write_results(output, records, summary, args)
+    print "results written to {0}.json/.csv".format(output)
+
+    if args.compare:
+        with open(args.compare, 'r') as f:
+            baseline = json.load(f)
+        regressions = compare(summary, baseline, args.gap_tolerance, args.throughput_tolerance)
+        for regression in regressions:
+            print "REGRESSION " + regression
+        if regressions:
+            return 1
+        print "no regressions against {0}".format(args.compare)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
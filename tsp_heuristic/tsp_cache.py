@@ -0,0 +1,132 @@
+# -*- coding: utf-8 -*-
+
+import os
+import json
+import shutil
+import hashlib
+import tempfile
+import numpy
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+CACHE_DIR = os.path.join(ROOT_DIR, 'cache')
+# cache directory is trimmed to this size, least recently used instances first
+CACHE_SIZE_LIMIT = 4 * 1024 ** 3
+SOURCES_FILE = 'sources.json'
+# bump when the layout or content of cached arrays changes
+CACHE_VERSION = 2
+
+
+def file_hash(file_path):
+    sha = hashlib.sha1(str(CACHE_VERSION))
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            sha.update(chunk)
+    return sha.hexdigest()
+
+
+def write_atomic(path, write):
+    """write to a temporary file first so readers never see partial files"""
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            write(f)
+        if os.name == 'nt' and os.path.exists(path):
+            os.remove(path)
+        os.rename(tmp, path)
+    except Exception:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+
+
+class InstanceCache(object):
+    """On-disk cache for one instance file, keyed by the hash of its content.
+    Arrays are stored as .npy files and loaded memory-mapped and read-only,
+    so several runs and worker processes share the same pages."""
+
+    def __init__(self, file_path, cache_dir=CACHE_DIR, size_limit=CACHE_SIZE_LIMIT):
+        self.cache_dir = cache_dir
+        self.size_limit = size_limit
+        self.key = file_hash(file_path)
+        self.path = os.path.join(cache_dir, self.key)
+        if not os.path.isdir(self.path):
+            os.makedirs(self.path)
+        self.invalidate_stale(os.path.realpath(file_path))
+        self.touch()
+
+    def invalidate_stale(self, source):
+        """drop the entry a previous version of the same file left behind"""
+        sources_file = os.path.join(self.cache_dir, SOURCES_FILE)
+        sources = {}
+        if os.path.isfile(sources_file):
+            try:
+                with open(sources_file, 'r') as f:
+                    sources = json.load(f)
+            except ValueError:
+                sources = {}
+        old_key = sources.get(source)
+        if old_key == self.key:
+            return
+        if old_key and old_key not in [key for path, key in sources.items() if path != source]:
+            shutil.rmtree(os.path.join(self.cache_dir, old_key), ignore_errors=True)
+        sources[source] = self.key
+        write_atomic(sources_file, lambda f: json.dump(sources, f))
+
+    def touch(self):
+        os.utime(self.path, None)
+
+    def array_path(self, name):
+        return os.path.join(self.path, name + '.npy')
+
+    def load(self, name):
+        """memory-mapped array or None if not cached"""
+        path = self.array_path(name)
+        if not os.path.isfile(path):
+            return None
+        try:
+            # plain ndarray view on the mapping, memmap indexing is slow
+            return numpy.load(path, mmap_mode='r').view(numpy.ndarray)
+        except (IOError, ValueError):
+            # truncated or corrupt entry
+            os.remove(path)
+            return None
+
+    def save(self, name, array):
+        write_atomic(self.array_path(name), lambda f: numpy.save(f, numpy.ascontiguousarray(array)))
+        self.evict()
+
+    def cached(self, name, compute):
+        array = self.load(name)
+        if array is None:
+            array = compute()
+            self.save(name, array)
+        return array
+
+    def load_meta(self):
+        path = os.path.join(self.path, 'meta.json')
+        if not os.path.isfile(path):
+            return None
+        with open(path, 'r') as f:
+            return json.load(f)
+
+    def save_meta(self, meta):
+        write_atomic(os.path.join(self.path, 'meta.json'), lambda f: json.dump(meta, f))
+
+    def evict(self):
+        """remove least recently used entries until the cache fits size_limit"""
+        entries = []
+        total = 0
+        for key in os.listdir(self.cache_dir):
+            path = os.path.join(self.cache_dir, key)
+            if not os.path.isdir(path):
+                continue
+            size = sum(os.path.getsize(os.path.join(path, f)) for f in os.listdir(path))
+            entries.append((os.path.getmtime(path), size, path))
+            total += size
+        for _, size, path in sorted(entries):
+            if total <= self.size_limit:
+                break
+            if path == self.path:
+                continue
+            shutil.rmtree(path, ignore_errors=True)
+            total -= size
@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+"""Checkpoints of a running search as .npz files: tours as int32 arrays,
+the state of both random generators, counters, timing and the hash caches.
+Writing one is atomic, so a crash while writing keeps the previous
+checkpoint. The per-iteration history and the improving tours only grow,
+they are appended to <checkpoint>.history and <checkpoint>.tours instead
+of being rewritten, so a checkpoint costs O(n + cache size) plus the rows
+added since the previous one. The .npz records how many rows belong to it,
+rows a crash left behind it are overwritten by the next append.
+
+    python tsp_cli.py brd14051 -k 8 --starter greedy -i 0 --checkpoint-interval 300
+    python tsp_cli.py --resume log/checkpoint/brd14051.npz
+"""
+
+import os
+import json
+import random
+import numpy
+
+from tsp_cache import write_atomic
+
+# bump when the content of checkpoints changes
+CHECKPOINT_VERSION = 3
+
+
+def pack_random_state():
+    """state of random and numpy.random as arrays"""
+    version, internal, gauss = random.getstate()
+    name, keys, pos, has_gauss, cached_gaussian = numpy.random.get_state()
+    return {'random_version': numpy.array(version),
+            'random_internal': numpy.array(internal, dtype=numpy.int64),
+            'random_gauss': numpy.array(numpy.nan if gauss is None else gauss),
+            'numpy_name': numpy.array(name),
+            'numpy_keys': keys,
+            'numpy_pos': numpy.array(pos),
+            'numpy_has_gauss': numpy.array(has_gauss),
+            'numpy_cached_gaussian': numpy.array(cached_gaussian)}
+
+
+def restore_random_state(state):
+    gauss = state['random_gauss'].item()
+    random.setstate((state['random_version'].item(),
+                     tuple(state['random_internal'].tolist()),
+                     None if numpy.isnan(gauss) else gauss))
+    numpy.random.set_state((str(state['numpy_name']),
+                            state['numpy_keys'],
+                            state['numpy_pos'].item(),
+                            state['numpy_has_gauss'].item(),
+                            state['numpy_cached_gaussian'].item()))
+
+
+def save_checkpoint(path, arrays, info):
+    """arrays: name -> numpy array, info: JSON-serializable dict"""
+    directory = os.path.dirname(path)
+    if directory and not os.path.isdir(directory):
+        os.makedirs(directory)
+    arrays = dict(arrays)
+    arrays['info'] = numpy.array(json.dumps(dict(info, version=CHECKPOINT_VERSION)))
+    write_atomic(path, lambda f: numpy.savez(f, **arrays))
+
+
+def load_checkpoint(path):
+    """returns (arrays, info) as passed to save_checkpoint, info['path'] is path"""
+    with numpy.load(path) as data:
+        arrays = dict((name, data[name]) for name in data.files)
+    info = json.loads(str(arrays.pop('info')))
+    if info.get('version') != CHECKPOINT_VERSION:
+        raise ValueError("Checkpoint '{0}' has version {1}, expected {2}".format(
+            path, info.get('version'), CHECKPOINT_VERSION))
+    info['path'] = path
+    return arrays, info
+
+
+def append_rows(path, rows, start):
+    """write the structured array rows to the raw file path from row start
+    on, dropping whatever followed it"""
+    with open(path, 'r+b' if os.path.isfile(path) else 'wb') as f:
+        f.seek(start * rows.dtype.itemsize)
+        f.truncate()
+        rows.tofile(f)
+
+
+def read_rows(path, dtype, count):
+    """first count rows of a file written by append_rows"""
+    if not count:
+        return numpy.empty(0, dtype=dtype)
+    rows = numpy.fromfile(path, dtype=dtype, count=count)
+    if len(rows) < count:
+        raise ValueError("'{0}' has {1} rows, the checkpoint needs {2}".format(path, len(rows), count))
+    return rows
@@ -0,0 +1,152 @@
+# -*- coding: utf-8 -*-
+"""Headless batch runner, runs are stored in log/runs/ like GUI runs, see tsp_runstore.
+
+    python tsp_cli.py berlin52 ch150 --iterations 400 --seed 1 --runs 5
+    python tsp_cli.py --resume log/checkpoint/brd14051.npz
+"""
+
+import os
+import sys
+import signal
+import argparse
+
+from tsp_solver import Solver, ROOT_DIR
+from tsp_neighbors import NEIGHBOR_INDEXES
+from tsp_distance import DISTANCE_MODES
+from tsp_tour import TOUR_TYPES
+from tsp_localsearch import LOCAL_SEARCH_MODES
+from tsp_construct import STARTERS
+from tsp_acceptance import ACCEPTANCE_RULES, KICKS
+from tsp_checkpoint import load_checkpoint
+from tsp_decompose import DECOMPOSE_ITERATIONS, DECOMPOSE_ROUNDS
+
+PROBLEMS_DIR = os.path.join(ROOT_DIR, 'problems')
+
+
+def collect_problems():
+    for file in sorted(os.listdir(PROBLEMS_DIR)):
+        if file.endswith('.tsp'):
+            yield file
+
+
+def resolve_instance(name):
+    """accepts a path, a file name in problems/ or an instance name"""
+    for path in (name, os.path.join(PROBLEMS_DIR, name), os.path.join(PROBLEMS_DIR, name + '.tsp')):
+        if os.path.isfile(path):
+            return path
+    raise ValueError("Instance '{0}' not found".format(name))
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description="Iterated local search for TSPLIB instances")
+    parser.add_argument('instances', nargs='*',
+                        help="instance names or paths, default: every .tsp file in problems/")
+    parser.add_argument('-i', '--iterations', type=int, default=400, help="iteration limit per run, 0 = none")
+    parser.add_argument('-t', '--time-limit', type=float, default=None, help="time limit per run in seconds")
+    parser.add_argument('--stall-seconds', type=float, default=None,
+                        help="stop after this many seconds without an improvement")
+    parser.add_argument('--stall-iterations', type=int, default=None,
+                        help="stop after this many iterations without an improvement")
+    parser.add_argument('-s', '--seed', type=int, default=None, help="seed of the first run, run r uses seed + r")
+    parser.add_argument('-r', '--runs', type=int, default=1, help="runs per instance")
+    parser.add_argument('--alternative', action='store_true', help="random 2-opt with an idle limit")
+    parser.add_argument('--idle-limit', type=int, default=100, help="idle limit of the alternative search")
+    parser.add_argument('--alt-batch', type=int, default=1,
+                        help="random moves scored per numpy batch in the alternative search")
+    parser.add_argument('--alt-pick', choices=('best', 'first'), default='best',
+                        help="improving move of a batch that is applied")
+    parser.add_argument('-l', '--local-search', choices=LOCAL_SEARCH_MODES, default='2opt',
+                        help="2-opt only or 2-opt with Or-opt and segment insertion")
+    parser.add_argument('--starter', choices=STARTERS, default='random', help="construction of the initial tour")
+    parser.add_argument('--acceptance', choices=ACCEPTANCE_RULES, default='better',
+                        help="when a new local optimum replaces the current solution")
+    parser.add_argument('--kick', choices=KICKS, default='random',
+                        help="double bridge over the whole tour or within an adaptive neighborhood")
+    parser.add_argument('-k', '--neighbors', type=int, default=0, help="candidate neighbors per city, 0 = all")
+    parser.add_argument('--neighbor-index', choices=NEIGHBOR_INDEXES, default='grid')
+    parser.add_argument('--distance-mode', choices=DISTANCE_MODES, default='auto')
+    parser.add_argument('--tour-type', choices=TOUR_TYPES, default='auto')
+    parser.add_argument('-w', '--workers', type=int, default=1, help="parallel ILS trajectories")
+    parser.add_argument('--decompose-window', type=int, default=0,
+                        help="optimize tour windows of this many cities as sub-problems, needs -k")
+    parser.add_argument('--decompose-rounds', type=int, default=DECOMPOSE_ROUNDS)
+    parser.add_argument('--decompose-iterations', type=int, default=DECOMPOSE_ITERATIONS,
+                        help="ILS iterations per window")
+    parser.add_argument('--trace', action='store_true', help="write a line per iteration to log/trace/")
+    parser.add_argument('--profile', action='store_true',
+                        help="cProfile every run to log/profile/, same as TSP_PROFILE=1")
+    parser.add_argument('--checkpoint-interval', type=float, default=None,
+                        help="seconds between two checkpoints of a run")
+    parser.add_argument('--checkpoint-path', default=None, help="default: log/checkpoint/<name>.npz")
+    parser.add_argument('--resume', default=None, metavar='CHECKPOINT',
+                        help="continue the run saved in a checkpoint, other options are ignored")
+    parser.add_argument('--no-cache', action='store_true', help="do not use the instance cache")
+    return parser.parse_args(argv)
+
+
+def solve_interruptible(solver, checkpoint=None):
+    # Ctrl+C stops the run cooperatively and keeps its best tour
+    previous = signal.signal(signal.SIGINT, lambda signum, frame: solver.cancel())
+    try:
+        if checkpoint is not None:
+            return solver.resume(checkpoint)
+        return solver.solve()
+    finally:
+        signal.signal(signal.SIGINT, previous)
+
+
+def report(solver, best, run):
+    print "{0} run {1}: distance {2} after {3} iterations in {4} (best at {5}, {6} start {7} in {8}, " \
+          "stopped by {9})".format(
+        solver.meta['name'], run + 1, best['distance'], solver.iterations, solver.runtime,
+        best['iteration'], solver.starter, solver.starter_distance, solver.starter_runtime,
+        solver.stop_reason)
+    print "    " + solver.profiler.summary()
+
+
+def main(argv=None):
+    args = parse_args(sys.argv[1:] if argv is None else argv)
+    if args.resume:
+        checkpoint = load_checkpoint(args.resume)
+        solver = Solver(checkpoint[1]['file_path'], use_cache=not args.no_cache)
+        # keep checkpointing into the file the run resumed from
+        checkpoint[1]['parameters']['checkpoint_path'] = args.resume
+        report(solver, solve_interruptible(solver, checkpoint), 0)
+        return 130 if solver.cancelled else 0
+    instances = args.instances or list(collect_problems())
+    for instance in instances:
+        solver = Solver(resolve_instance(instance), use_cache=not args.no_cache)
+        for run in range(args.runs):
+            seed = None if args.seed is None else args.seed + run
+            solver.setParameters(args.iterations, args.alternative, args.idle_limit,
+                                 neighbor_k=args.neighbors,
+                                 neighbor_index=args.neighbor_index,
+                                 distance_mode=args.distance_mode,
+                                 workers=args.workers,
+                                 seed=seed,
+                                 time_limit=args.time_limit,
+                                 tour_type=args.tour_type,
+                                 local_search_mode=args.local_search,
+                                 starter=args.starter,
+                                 acceptance=args.acceptance,
+                                 kick=args.kick,
+                                 alt_batch=args.alt_batch,
+                                 alt_pick=args.alt_pick,
+                                 trace=args.trace,
+                                 profile=args.profile or None,
+                                 stall_seconds=args.stall_seconds,
+                                 stall_iterations=args.stall_iterations,
+                                 checkpoint_interval=args.checkpoint_interval,
+                                 checkpoint_path=args.checkpoint_path,
+                                 decompose_window=args.decompose_window,
+                                 decompose_rounds=args.decompose_rounds,
+                                 decompose_iterations=args.decompose_iterations)
+            best = solve_interruptible(solver)
+            report(solver, best, run)
+            if solver.cancelled:
+                return 130
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
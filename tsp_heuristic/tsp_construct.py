@@ -0,0 +1,189 @@
+# -*- coding: utf-8 -*-
+"""Constructive start tours. Apart from 'random' every starter works on the
+candidate neighbor lists (or on coordinates for 'hilbert') and runs in about
+O(n log n), so large instances do not spend the first local search untangling
+a random permutation."""
+
+import random
+import numpy
+
+STARTERS = ('random', 'nearest', 'greedy', 'hilbert', 'mst')
+# neighbors per city used by the starters when the solver has no candidate lists
+STARTER_NEIGHBORS = 10
+# resolution of the Hilbert curve, 2^HILBERT_ORDER cells per axis
+HILBERT_ORDER = 16
+
+
+def construct_tour(starter, n, dist, coords=None, neighbors=None):
+    """Start tour over cities 0..n-1 as list.
+    neighbors is an (n, k) array of candidate lists sorted by distance,
+    required by 'nearest', 'greedy' and 'mst'."""
+    if starter == 'random':
+        return random_tour(n)
+    elif starter == 'hilbert':
+        if coords is None:
+            raise ValueError("Starter 'hilbert' requires coordinates")
+        return hilbert_tour(coords)
+    elif starter in ('nearest', 'greedy', 'mst'):
+        if neighbors is None:
+            raise ValueError("Starter '{0}' requires neighbor lists".format(starter))
+        if starter == 'nearest':
+            return nearest_neighbor_tour(dist, neighbors)
+        elif starter == 'greedy':
+            return greedy_tour(dist, neighbors)
+        return mst_tour(dist, neighbors)
+    raise ValueError("Unknown starter '{0}', use one of {1}".format(starter, STARTERS))
+
+
+def random_tour(n):
+    """random permutation starting at city 0"""
+    tour = range(1, n)
+    random.shuffle(tour)
+    return [0] + tour
+
+
+def nearest_unvisited(dist, city, visited):
+    """fallback when all candidates of city are visited, one vectorized scan"""
+    remaining = numpy.flatnonzero(~visited)
+    return int(remaining[numpy.argmin(dist[city, remaining])])
+
+
+def nearest_neighbor_tour(dist, neighbors):
+    """Walk to the nearest unvisited candidate, scan all unvisited cities
+    only when every candidate is taken. Starts at a random city."""
+    n = len(neighbors)
+    candidates = neighbors.tolist()
+    visited = numpy.zeros(n, dtype=bool)
+    city = random.randrange(n)
+    tour = [city]
+    visited[city] = True
+    for _ in xrange(n - 1):
+        for following in candidates[city]:
+            if not visited[following]:
+                break
+        else:
+            following = nearest_unvisited(dist, city, visited)
+        city = following
+        visited[city] = True
+        tour.append(city)
+    return tour
+
+
+def candidate_edges(dist, neighbors):
+    """undirected candidate edges (i, j) as two int arrays sorted by length"""
+    n, k = neighbors.shape
+    i = numpy.repeat(numpy.arange(n, dtype=numpy.int32), k)
+    j = neighbors.ravel()
+    low, high = numpy.minimum(i, j), numpy.maximum(i, j)
+    keys = numpy.unique(low.astype(numpy.int64) * n + high)
+    low, high = (keys // n).astype(numpy.int32), (keys % n).astype(numpy.int32)
+    order = numpy.argsort(numpy.asarray(dist[low, high]), kind='mergesort')
+    return low[order], high[order]
+
+
+def find(parent, city):
+    while parent[city] != city:
+        parent[city] = parent[parent[city]]
+        city = parent[city]
+    return city
+
+
+def greedy_tour(dist, neighbors):
+    """Greedy edge matching: take candidate edges shortest first while both
+    ends have degree < 2 and no cycle closes, then chain the fragments
+    nearest endpoint first."""
+    n = len(neighbors)
+    parent = range(n)
+    links = [[] for _ in xrange(n)]
+    for a, b in zip(*[side.tolist() for side in candidate_edges(dist, neighbors)]):
+        if len(links[a]) < 2 and len(links[b]) < 2:
+            root_a, root_b = find(parent, a), find(parent, b)
+            if root_a != root_b:
+                parent[root_a] = root_b
+                links[a].append(b)
+                links[b].append(a)
+    return chain_fragments(dist, links)
+
+
+def chain_fragments(dist, links):
+    """Join the paths given by links (cities of degree 0 are paths too) into
+    one tour, always continuing with the fragment whose endpoint is nearest."""
+    n = len(links)
+    is_end = numpy.array([len(linked) < 2 for linked in links], dtype=bool)
+    visited = numpy.zeros(n, dtype=bool)
+    tour = []
+    city = int(numpy.flatnonzero(is_end)[0]) if is_end.any() else 0
+    while True:
+        # walk the fragment from its endpoint city
+        previous = None
+        while True:
+            tour.append(city)
+            visited[city] = True
+            is_end[city] = False
+            following = [linked for linked in links[city] if linked != previous]
+            if not following or visited[following[0]]:
+                break
+            previous, city = city, following[0]
+        if len(tour) == n:
+            return tour
+        ends = numpy.flatnonzero(is_end)
+        city = int(ends[numpy.argmin(dist[city, ends])])
+
+
+def mst_tour(dist, neighbors):
+    """MST doubling (Christofides without the matching): minimum spanning tree
+    of the candidate graph by Kruskal, shortcut to its preorder walk. If the
+    candidate graph is disconnected the walks of the trees are concatenated."""
+    n = len(neighbors)
+    parent = range(n)
+    children = [[] for _ in xrange(n)]
+    edges = 0
+    for a, b in zip(*[side.tolist() for side in candidate_edges(dist, neighbors)]):
+        root_a, root_b = find(parent, a), find(parent, b)
+        if root_a != root_b:
+            parent[root_a] = root_b
+            children[a].append(b)
+            children[b].append(a)
+            edges += 1
+            if edges == n - 1:
+                break
+    visited = [False] * n
+    tour = []
+    for root in xrange(n):
+        if visited[root]:
+            continue
+        stack = [root]
+        visited[root] = True
+        while stack:
+            city = stack.pop()
+            tour.append(city)
+            # pushed in reverse, so the shortest tree edge is walked first
+            for linked in reversed(children[city]):
+                if not visited[linked]:
+                    visited[linked] = True
+                    stack.append(linked)
+    return tour
+
+
+def hilbert_tour(coords):
+    """Order the cities along a Hilbert curve over their bounding box"""
+    coords = numpy.asarray(coords, dtype=numpy.float64)
+    side = 2 ** HILBERT_ORDER
+    lower = coords.min(axis=0)
+    extent = numpy.maximum(coords.max(axis=0) - lower, 1e-9).max()
+    cells = numpy.minimum(((coords - lower) / extent * side).astype(numpy.int64), side - 1)
+    x, y = cells[:, 0].copy(), cells[:, 1].copy()
+    index = numpy.zeros(len(coords), dtype=numpy.int64)
+    s = side // 2
+    while s > 0:
+        rx = (x & s) > 0
+        ry = (y & s) > 0
+        index += s * s * ((3 * rx) ^ ry)
+        # rotate the quadrant so the curve continues
+        flip = ~ry & rx
+        x[flip] = side - 1 - x[flip]
+        y[flip] = side - 1 - y[flip]
+        swap = ~ry
+        x[swap], y[swap] = y[swap], x[swap]
+        s //= 2
+    return numpy.argsort(index, kind='mergesort').tolist()
@@ -0,0 +1,179 @@
+# -*- coding: utf-8 -*-
+"""Decomposition for very large instances (POPMUSIC-style tour windows).
+
+The tour is cut into windows of consecutive cities. Each window is a path
+with fixed end cities, solved as a sub-problem by the regular ILS on its
+own distance matrix, in which the edge between the two ends gets a large
+negative weight so every good sub-tour keeps it. Windows of one round do
+not overlap and are solved in a process pool, then stitched back in place.
+The next round shifts the window borders by half a window. A final
+candidate local search over the whole tour polishes the seams.
+"""
+
+import time
+import random
+import itertools
+import multiprocessing
+from collections import OrderedDict
+from datetime import datetime
+from timeit import default_timer
+import numpy
+
+# rounds of windows, each shifted by half a window
+DECOMPOSE_ROUNDS = 2
+# ILS iterations per window
+DECOMPOSE_ITERATIONS = 100
+# windows with fewer cities are left as they are
+MIN_WINDOW = 8
+
+
+def decompose(solver, start_timestamp):
+    """Start tour, window rounds and polish for solver, returns the solution.
+    time_limit and cancel() are checked between windows, the stall limits
+    between rounds. Each window gets the time left as its own limit."""
+    if not solver.neighbor_k:
+        raise ValueError("Decomposition needs candidate lists, set neighbor_k")
+    solution = {'tour': solver.initial_tour(), 'distance': solver.starter_distance}
+    with solver.profiler.phase('local_search'):
+        solution = solver.local_search_candidates(solution)
+    solver.improvements.append(((datetime.now() - start_timestamp).total_seconds(), 0, solution['distance']))
+    last_improvement = (0, default_timer())
+
+    pool = multiprocessing.Pool(solver.workers) if solver.workers > 1 else None
+    try:
+        for index in range(solver.decompose_rounds):
+            if solver.should_stop() or solver.stagnated(index, last_improvement):
+                break
+            offset = (index * solver.decompose_window // 2) % solver.dimension
+            distance = solution['distance']
+            solution = solve_windows(solver, solution, offset, pool)
+            solver.iterations += 1
+            if solution['distance'] < distance:
+                seconds = (datetime.now() - start_timestamp).total_seconds()
+                solver.improvements.append((seconds, index + 1, solution['distance']))
+                last_improvement = (index + 1, default_timer())
+            solver.report_progress(solution)
+    finally:
+        if pool is not None:
+            if solver.stop_reason is not None:
+                # windows still running only burn their remaining budget
+                pool.terminate()
+            else:
+                pool.close()
+            pool.join()
+
+    # polish the seams
+    with solver.profiler.phase('local_search'):
+        solution = solver.local_search_candidates(solution)
+    solution['iteration'] = solver.iterations
+    solution['runtime'] = datetime.now() - start_timestamp
+    solver.history.record(solution, solution['runtime'].total_seconds(), True, True)
+    if solver.stop_reason is None:
+        solver.stop_reason = 'iterations'
+    return solution
+
+
+def solve_windows(solver, solution, offset, pool):
+    """one round: cut the tour at offset into windows, solve, stitch.
+    Once the solver should stop the remaining windows are kept as they are."""
+    tour = solution['tour'][offset:] + solution['tour'][:offset]
+    size = solver.decompose_window
+    windows = [tour[start:start + size] for start in range(0, len(tour), size)]
+    parameters = sub_parameters(solver)
+    # wall clock, shared with the pool processes
+    deadline = None if solver.deadline is None else time.time() + solver.deadline - default_timer()
+    # workers only get the window matrices, the distance matrix may be an oracle
+    tasks = ((window_matrix(solver.dist_matrix, numpy.array(window)), parameters, random.randrange(2 ** 31), deadline)
+             for window in windows if len(window) >= MIN_WINDOW)
+    # lazy, so a stop request skips the windows not solved yet
+    results = pool.imap(solve_window, tasks) if pool is not None else itertools.imap(solve_window, tasks)
+
+    stitched = []
+    distance = solution['distance']
+    for window in windows:
+        if len(window) < MIN_WINDOW or solver.should_stop():
+            stitched.extend(window)
+            continue
+        order, gain = next(results)
+        if gain > 0:
+            stitched.extend(window[i] for i in order)
+            distance -= gain
+        else:
+            stitched.extend(window)
+    return {'tour': stitched, 'distance': distance}
+
+
+def window_matrix(dist, window):
+    """distances between the cities of window with the end-to-end edge fixed"""
+    matrix = numpy.array(dist[window[:, None], window[None, :]], dtype=numpy.int64)
+    m = len(window)
+    # longer than any tour through the window, so no move gains by dropping the edge
+    fixed = m * int(matrix.max()) + 1
+    if fixed >= 2 ** 30:
+        raise ValueError("Window of {0} cities is too large for an int32 sub-problem".format(m))
+    matrix[0, m - 1] = matrix[m - 1, 0] = -fixed
+    return matrix.astype(numpy.int32)
+
+
+def sub_parameters(solver):
+    parameters = solver.parameters()
+    parameters.update({'iteration_limit': solver.decompose_iterations,
+                       'neighbor_k': solver.neighbor_k or 8,
+                       'workers': 1,
+                       'time_limit': None,
+                       'stall_seconds': None,
+                       # the stall limits count rounds of the whole run
+                       'stall_iterations': None,
+                       'trace': False,
+                       'profile': False,
+                       'checkpoint_interval': None,
+                       'checkpoint_path': None,
+                       'decompose_window': 0,
+                       'tour_type': 'array'})
+    return parameters
+
+
+def solve_window(task):
+    """ILS on one window, returns (order of the window's cities, gain).
+    The sub-solver seeds the global random generators, their state is
+    restored afterwards so solving inline does not disturb the caller's
+    sequence (results then match those of a pool)."""
+    # tsp_solver imports this module
+    from tsp_solver import Solver
+
+    matrix, parameters, seed, deadline = task
+    if deadline is not None:
+        remaining = deadline - time.time()
+        if remaining <= 0:
+            return None, 0
+        parameters = dict(parameters, time_limit=remaining)
+    m = len(matrix)
+    meta = OrderedDict([('name', 'window'), ('dimension', m), ('edge_weight_type', 'EXPLICIT')])
+    solver = Solver(None, instance=(meta, None, matrix))
+    parameters = dict(parameters, seed=seed)
+    solver.setParameters(**parameters)
+    solver.initial = range(m)
+    state = random.getstate(), numpy.random.get_state()
+    try:
+        best = solver.solve()
+    finally:
+        random.setstate(state[0])
+        numpy.random.set_state(state[1])
+
+    path = fixed_path(best['tour'], m)
+    if path is None:
+        return None, 0
+    before = sum(matrix[i, i + 1] for i in range(m - 1))
+    after = sum(matrix[path[i], path[i + 1]] for i in range(m - 1))
+    return path, int(before) - int(after)
+
+
+def fixed_path(tour, m):
+    """the sub-tour as path from city 0 to city m - 1, None if it lost the fixed edge"""
+    i = tour.index(0)
+    tour = tour[i:] + tour[:i]
+    if tour[1] == m - 1:
+        tour = [0] + tour[1:][::-1]
+    if tour[-1] != m - 1:
+        return None
+    return tour
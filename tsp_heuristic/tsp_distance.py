@@ -0,0 +1,156 @@
+# -*- coding: utf-8 -*-
+
+import math
+import numpy
+
+NUMPY_PRECISION = 2
+# largest instance that gets a dense matrix, 8000^2 int32 = 256 MB
+DENSE_LIMIT = 8000
+# rows computed per block while filling a dense matrix
+BLOCK_SIZE = 256
+DISTANCE_MODES = ('auto', 'dense', 'neighbors', 'coordinates')
+METRICS = ('EUC_2D', 'CEIL_2D', 'ATT', 'GEO')
+# constants of the TSPLIB GEO distance
+GEO_PI = 3.141592
+GEO_RADIUS = 6378.388
+
+
+def distance_oracle(data, neighbors=None, mode='auto', metric='EUC_2D', weights=None):
+    """Pick the distance backend for an instance.
+    'dense' is a full matrix, 'neighbors' caches only candidate distances and
+    'coordinates' computes every distance on the fly. All backends support
+    oracle[a, b] for single cities and for index arrays.
+    EXPLICIT instances pass their weight matrix, which is always used as is."""
+    if weights is not None:
+        return weights
+    coords = numpy.asarray(data, dtype=numpy.float64)
+    mode = resolve_mode(len(coords), neighbors, mode)
+    if mode == 'dense':
+        return dense_matrix(coords, metric)
+    elif mode == 'neighbors':
+        if neighbors is None:
+            raise ValueError("Distance mode 'neighbors' needs candidate neighbor lists")
+        return NeighborDistance(coords, neighbors, metric)
+    elif mode == 'coordinates':
+        return CoordinateDistance(coords, metric)
+    raise ValueError("Unknown distance mode '{0}', use one of {1}".format(mode, DISTANCE_MODES))
+
+
+def resolve_mode(n, neighbors=None, mode='auto'):
+    if mode != 'auto':
+        return mode
+    if n <= DENSE_LIMIT:
+        return 'dense'
+    elif neighbors is not None:
+        return 'neighbors'
+    return 'coordinates'
+
+
+def nint(x):
+    return numpy.floor(x + 0.5)
+
+
+def geo_radians(coords):
+    """TSPLIB GEO coordinates are DDD.MM (degrees and minutes)"""
+    degrees = numpy.trunc(coords)
+    return GEO_PI * (degrees + 5.0 * (coords - degrees) / 3.0) / 180.0
+
+
+def pairwise(a, b, metric='EUC_2D'):
+    """TSPLIB distances between two coordinate arrays of shape (..., 2)"""
+    if metric == 'GEO':
+        a, b = geo_radians(a), geo_radians(b)
+        q1 = numpy.cos(a[..., 1] - b[..., 1])
+        q2 = numpy.cos(a[..., 0] - b[..., 0])
+        q3 = numpy.cos(a[..., 0] + b[..., 0])
+        cos = numpy.clip(0.5 * ((1.0 + q1) * q2 - (1.0 - q1) * q3), -1.0, 1.0)
+        return numpy.trunc(GEO_RADIUS * numpy.arccos(cos) + 1.0).astype(numpy.int32)
+    diff = a - b
+    squared = (diff ** 2).sum(axis=-1)
+    if metric == 'EUC_2D':
+        return nint(numpy.sqrt(squared)).astype(numpy.int32)
+    elif metric == 'CEIL_2D':
+        return numpy.ceil(numpy.sqrt(squared)).astype(numpy.int32)
+    elif metric == 'ATT':
+        r = numpy.sqrt(squared / 10.0)
+        t = nint(r)
+        return (t + (t < r)).astype(numpy.int32)
+    raise ValueError("Unknown metric '{0}', use one of {1}".format(metric, METRICS))
+
+
+def dense_matrix(coords, metric='EUC_2D'):
+    """full n x n int32 matrix, filled block-wise so no n x n temporaries are created"""
+    n = len(coords)
+    matrix = numpy.empty((n, n), dtype=numpy.int32)
+    for start in range(0, n, BLOCK_SIZE):
+        stop = min(start + BLOCK_SIZE, n)
+        matrix[start:stop] = pairwise(coords[start:stop, None, :], coords[None, :, :], metric)
+    return matrix
+
+
+def tour_length(dist, tour):
+    tour = numpy.asarray(tour)
+    return dist[tour, numpy.roll(tour, -1)].sum().item()
+
+
+class CoordinateDistance(object):
+    """Computes every distance from the coordinates, needs O(n) memory"""
+
+    def __init__(self, coords, metric='EUC_2D'):
+        if metric not in METRICS:
+            raise ValueError("Unknown metric '{0}', use one of {1}".format(metric, METRICS))
+        self.coords = coords
+        self.metric = metric
+        if metric == 'GEO':
+            self.xs, self.ys = geo_radians(coords).T.tolist()
+        else:
+            self.xs, self.ys = coords.T.tolist()
+
+    def __len__(self):
+        return len(self.xs)
+
+    def __getitem__(self, key):
+        a, b = key
+        if isinstance(a, numpy.ndarray) or isinstance(b, numpy.ndarray):
+            return pairwise(self.coords[a], self.coords[b], self.metric)
+        return self.distance(a, b)
+
+    def distance(self, a, b):
+        metric = self.metric
+        if metric == 'GEO':
+            q1 = math.cos(self.ys[a] - self.ys[b])
+            q2 = math.cos(self.xs[a] - self.xs[b])
+            q3 = math.cos(self.xs[a] + self.xs[b])
+            cos = max(-1.0, min(1.0, 0.5 * ((1.0 + q1) * q2 - (1.0 - q1) * q3)))
+            return int(GEO_RADIUS * math.acos(cos) + 1.0)
+        d = math.hypot(self.xs[a] - self.xs[b], self.ys[a] - self.ys[b])
+        if metric == 'EUC_2D':
+            return int(d + 0.5)
+        elif metric == 'CEIL_2D':
+            return int(math.ceil(d))
+        r = d / math.sqrt(10.0)
+        t = int(r + 0.5)
+        return t + 1 if t < r else t
+
+
+class NeighborDistance(CoordinateDistance):
+    """Sparse matrix holding only candidate neighbor distances,
+    all other pairs fall back to the coordinates"""
+
+    def __init__(self, coords, neighbors, metric='EUC_2D'):
+        super(NeighborDistance, self).__init__(coords, metric)
+        rows = numpy.repeat(numpy.arange(len(coords)), neighbors.shape[1])
+        cols = neighbors.ravel()
+        values = pairwise(coords[rows], coords[cols], metric).tolist()
+        rows, cols = rows.tolist(), cols.tolist()
+        self.cache = dict(zip(zip(rows, cols), values))
+        self.cache.update(zip(zip(cols, rows), values))
+
+    def __getitem__(self, key):
+        a, b = key
+        if isinstance(a, numpy.ndarray) or isinstance(b, numpy.ndarray):
+            return pairwise(self.coords[a], self.coords[b], self.metric)
+        value = self.cache.get(key)
+        if value is None:
+            return self.distance(a, b)
+        return value
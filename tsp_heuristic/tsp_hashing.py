@@ -0,0 +1,93 @@
+# -*- coding: utf-8 -*-
+
+from collections import OrderedDict
+import numpy
+
+# fixed, so every worker process derives the same keys
+ZOBRIST_SEED = 20170425
+# local optima and start states remembered per run, 0 disables the cache
+CACHE_SIZE = 10000
+
+
+MASK = 2 ** 64 - 1
+
+
+def mix(x):
+    """splitmix64 finalizer, a bijection of 64-bit integers"""
+    x = ((x ^ (x >> 30)) * 0xbf58476d1ce4e5b9) & MASK
+    x = ((x ^ (x >> 27)) * 0x94d049bb133111eb) & MASK
+    return x ^ (x >> 31)
+
+
+def mix_array(x):
+    """mix for uint64 arrays, the products wrap modulo 2 ** 64"""
+    x = (x ^ (x >> numpy.uint64(30))) * numpy.uint64(0xbf58476d1ce4e5b9)
+    x = (x ^ (x >> numpy.uint64(27))) * numpy.uint64(0x94d049bb133111eb)
+    return x ^ (x >> numpy.uint64(31))
+
+
+class TourHash(object):
+    """Zobrist hash of a tour: XOR over its undirected edges of a random
+    64-bit value per city pair. The value is mix(salt ^ (min << 32 | max)),
+    so it needs no n x n table and independent pairs get independent
+    values. The key does not depend on rotation or orientation and a move
+    updates it in O(1) by XORing the removed and the added edges."""
+
+    def __init__(self, n):
+        self.n = n
+        self.salt = numpy.random.RandomState(ZOBRIST_SEED).randint(0, 2 ** 62) << 2
+
+    def edge(self, a, b):
+        if a < b:
+            return mix(self.salt ^ (a << 32 | b))
+        return mix(self.salt ^ (b << 32 | a))
+
+    def tour(self, tour):
+        """key of a whole tour, vectorized"""
+        tour = numpy.asarray(tour, dtype=numpy.uint64)
+        following = numpy.roll(tour, -1)
+        low, high = numpy.minimum(tour, following), numpy.maximum(tour, following)
+        pairs = numpy.uint64(self.salt) ^ (low << numpy.uint64(32) | high)
+        return int(numpy.bitwise_xor.reduce(mix_array(pairs)))
+
+
+class LRUCache(object):
+    """Bounded mapping dropping the least recently used key, counts hits"""
+
+    def __init__(self, capacity=CACHE_SIZE):
+        self.capacity = capacity
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def get(self, key):
+        value = self.entries.pop(key, None)
+        if value is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.entries[key] = value
+        return value
+
+    def put(self, key, value):
+        self.entries.pop(key, None)
+        self.entries[key] = value
+        if len(self.entries) > self.capacity:
+            self.entries.popitem(last=False)
+
+    def items(self):
+        """(key, value) pairs, least recently used first"""
+        return self.entries.items()
+
+    def restore(self, items, hits, misses):
+        """counterpart of items, for checkpoints"""
+        self.entries = OrderedDict(items)
+        self.hits = hits
+        self.misses = misses
+
+    def hit_rate(self):
+        lookups = self.hits + self.misses
+        return self.hits / float(lookups) if lookups else 0.0
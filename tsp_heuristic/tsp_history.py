@@ -0,0 +1,147 @@
+# -*- coding: utf-8 -*-
+
+import heapq
+import numpy
+
+# distinct best tours archived besides the improving ones
+TOP_K = 10
+# initial number of iterations the record arrays hold, they double when full
+INITIAL_CAPACITY = 1024
+# one iteration of the record as written to checkpoints, see SolutionHistory.rows
+ROW_DTYPE = numpy.dtype([('distance', numpy.int64), ('runtime', numpy.float64), ('accepted', bool)])
+
+
+def tour_dtype(dimension):
+    """an archived tour with its iteration index, see SolutionHistory.improving_tours"""
+    return numpy.dtype([('index', numpy.int64), ('tour', numpy.int32, (dimension,))])
+
+
+class SolutionHistory(object):
+    """Compact record of a run. Every iteration stores only its distance,
+    runtime and whether it was accepted, in numpy arrays. Full tours are
+    archived as int32 arrays for improving solutions and for the top_k best
+    distinct distances, other tours are dropped (or evicted once they leave
+    the top_k)."""
+
+    def __init__(self, top_k=TOP_K, capacity=INITIAL_CAPACITY):
+        self.top_k = top_k
+        self.count = 0
+        # tour lengths are integral for every TSPLIB edge weight type
+        self.distance = numpy.empty(capacity, dtype=numpy.int64)
+        self.runtime = numpy.empty(capacity, dtype=numpy.float64)
+        self.accepted = numpy.empty(capacity, dtype=bool)
+        self.improving = set()
+        # iteration index -> int32 tour
+        self.archive = {}
+        # max-heap of (-distance, index) over the top_k distinct distances
+        self.top = []
+        self.top_distances = set()
+
+    def __len__(self):
+        return self.count
+
+    def grow(self):
+        capacity = 2 * len(self.distance)
+        for name in ('distance', 'runtime', 'accepted'):
+            old = getattr(self, name)
+            new = numpy.empty(capacity, dtype=old.dtype)
+            new[:self.count] = old[:self.count]
+            setattr(self, name, new)
+
+    def record(self, solution, seconds, accepted, improving):
+        """add one iteration, returns its index.
+        Solutions without a tour (skipped searches) are only recorded."""
+        if self.count == len(self.distance):
+            self.grow()
+        index = self.count
+        self.distance[index] = solution['distance']
+        self.runtime[index] = seconds
+        self.accepted[index] = accepted
+        self.count += 1
+        if solution['tour'] is None:
+            return index
+        if improving:
+            self.improving.add(index)
+            self.archive_tour(index, solution['tour'])
+        self.rank(index, solution)
+        return index
+
+    def rank(self, index, solution):
+        distance = solution['distance']
+        if distance in self.top_distances:
+            return
+        if len(self.top) == self.top_k:
+            if distance >= -self.top[0][0]:
+                return
+            _, evicted = heapq.heappop(self.top)
+            self.top_distances.discard(self.distance[evicted].item())
+            if evicted not in self.improving:
+                del self.archive[evicted]
+        heapq.heappush(self.top, (-distance, index))
+        self.top_distances.add(distance)
+        self.archive_tour(index, solution['tour'])
+
+    def archive_tour(self, index, tour):
+        if index not in self.archive:
+            self.archive[index] = numpy.array(tour, dtype=numpy.int32)
+
+    def distances(self):
+        return self.distance[:self.count]
+
+    def runtimes(self):
+        return self.runtime[:self.count]
+
+    def acceptances(self):
+        return self.accepted[:self.count]
+
+    def is_archived(self, index):
+        return index in self.archive
+
+    def tour(self, index):
+        """archived tour of iteration index as int32 array, None if it was dropped"""
+        return self.archive.get(index)
+
+    def archived(self):
+        """indexes with an archived tour, in iteration order"""
+        return sorted(self.archive)
+
+    def rows(self, start=0):
+        """iterations from start on as ROW_DTYPE records"""
+        rows = numpy.empty(self.count - start, dtype=ROW_DTYPE)
+        for name in ROW_DTYPE.names:
+            rows[name] = getattr(self, name)[start:self.count]
+        return rows
+
+    def improving_tours(self, dimension, start=0):
+        """tours of the improving iterations from start on as tour_dtype records"""
+        indexes = sorted(index for index in self.improving if index >= start)
+        tours = numpy.empty(len(indexes), dtype=tour_dtype(dimension))
+        for row, index in zip(tours, indexes):
+            row['index'] = index
+            row['tour'] = self.archive[index]
+        return tours
+
+    def state(self):
+        """arrays for a checkpoint besides rows and improving_tours: the
+        top_k ranking and its tours that are not improving ones, see restore"""
+        top = [index for _, index in self.top]
+        others = [index for index in top if index not in self.improving]
+        return {'history_top': numpy.array(top, dtype=numpy.int64),
+                'history_top_archived': numpy.array(others, dtype=numpy.int64),
+                'history_top_tours': numpy.array([self.archive[index] for index in others], dtype=numpy.int32)}
+
+    def restore(self, state, rows, tours):
+        """counterpart of state, rows and tours are all rows and improving tours of the run"""
+        count = len(rows)
+        while len(self.distance) < count:
+            self.grow()
+        self.count = count
+        for name in ROW_DTYPE.names:
+            getattr(self, name)[:count] = rows[name]
+        indexes = tours['index'].tolist()
+        self.improving = set(indexes)
+        self.archive = dict(zip(indexes, tours['tour']))
+        self.archive.update(zip(state['history_top_archived'].tolist(), state['history_top_tours']))
+        self.top = [(-self.distance[index].item(), index) for index in state['history_top'].tolist()]
+        heapq.heapify(self.top)
+        self.top_distances = set(-distance for distance, _ in self.top)
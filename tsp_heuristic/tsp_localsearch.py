@@ -0,0 +1,230 @@
+# -*- coding: utf-8 -*-
+
+from collections import deque
+
+LOCAL_SEARCH_MODES = ('2opt', 'oropt')
+# smallest gain accepted as an improvement
+EPSILON = 1e-9
+# longest segment moved by Or-opt
+OR_OPT_LENGTH = 3
+# moves tried between two polls of the stop callback
+STOP_CHECK_INTERVAL = 256
+
+
+class CandidateSearch(object):
+    """Local search driven by a queue of active cities (don't-look bits).
+
+    Only moves adding an edge from an active city to one of its candidates
+    are tried: its k nearest neighbors, or every city if candidates is None.
+    Endpoints of applied moves are re-activated, so starting from a few
+    touched cities only re-optimizes around them.
+
+    mode '2opt' tries 2-opt moves only, 'oropt' additionally moves segments
+    of 1 to OR_OPT_LENGTH cities in both orientations (Or-opt) and swaps two
+    adjacent segments of any length (segment insertion 3-opt). All moves are
+    applied as reversals on the tour, see tsp_tour.
+
+    With a tsp_hashing.TourHash, key collects the XOR of all exchanged edges,
+    so the tour key after the search is the start key ^ key.
+
+    stop is polled every STOP_CHECK_INTERVAL active cities, the search ends
+    early with a valid (not locally optimal) tour once it returns True."""
+
+    def __init__(self, tour, dist, candidates=None, mode='2opt', hasher=None, stop=None):
+        if mode not in LOCAL_SEARCH_MODES:
+            raise ValueError("Unknown local search mode '{0}', use one of {1}".format(mode, LOCAL_SEARCH_MODES))
+        self.tour = tour
+        self.dist = dist
+        self.candidates = candidates
+        self.everyone = range(len(tour))
+        self.moves = [self.two_opt]
+        if mode == 'oropt':
+            self.moves += [self.or_opt, self.or_3opt]
+        self.queue = deque()
+        self.queued = [False] * len(tour)
+        self.evaluated = 0
+        self.applied = 0
+        self.hasher = hasher
+        self.key = 0
+        self.stop = stop
+
+    def run(self, active):
+        """Optimize until no active city is left, returns the total gain"""
+        queue, queued = self.queue, self.queued
+        for city in active:
+            if not queued[city]:
+                queued[city] = True
+                queue.append(city)
+        total = 0
+        polled = 0
+        while queue:
+            if self.stop is not None:
+                polled += 1
+                if polled == STOP_CHECK_INTERVAL:
+                    polled = 0
+                    if self.stop():
+                        break
+            a = queue.popleft()
+            queued[a] = False
+            for move in self.moves:
+                gain = move(a)
+                if gain:
+                    total += gain
+                    self.applied += 1
+                    # look at a again before the others
+                    queued[a] = True
+                    queue.appendleft(a)
+                    break
+        return total
+
+    def activate(self, *cities):
+        queue, queued = self.queue, self.queued
+        for city in cities:
+            if not queued[city]:
+                queued[city] = True
+                queue.append(city)
+
+    def rekey(self, *edges):
+        """XOR removed and added edges into the key"""
+        if self.hasher is not None:
+            for a, b in edges:
+                self.key ^= self.hasher.edge(a, b)
+
+    def neighbors(self, city):
+        return self.everyone if self.candidates is None else self.candidates[city]
+
+    def reverse_between(self, u, v, outside):
+        """reverse the path u..v whose end u is adjacent to outside"""
+        if self.tour.prev(u) == outside:
+            self.tour.reverse(u, v)
+        else:
+            self.tour.reverse(v, u)
+
+    def two_opt(self, a):
+        tour, dist = self.tour, self.dist
+        for forward, step in ((True, tour.next), (False, tour.prev)):
+            # succ: a-b ... c-d --> a-c ... b-d
+            # pred: b-a ... d-c --> b-d ... a-c
+            b = step(a)
+            d_ab = dist[a, b]
+            for c in self.neighbors(a):
+                d_ac = dist[a, c]
+                if d_ac >= d_ab:
+                    # candidate lists are sorted by distance
+                    if self.candidates is None:
+                        continue
+                    break
+                d = step(c)
+                if c == a or c == b or d == a:
+                    continue
+                self.evaluated += 1
+                gain = d_ab + dist[c, d] - d_ac - dist[b, d]
+                if gain > EPSILON:
+                    if forward:
+                        tour.reverse(b, c)
+                    else:
+                        tour.reverse(a, d)
+                    self.rekey((a, b), (c, d), (a, c), (b, d))
+                    self.activate(b, c, d)
+                    return gain
+        return 0
+
+    def or_opt(self, a):
+        """Move a segment of 1..OR_OPT_LENGTH cities starting or ending at a
+        between a candidate of one of its ends and that candidate's neighbor"""
+        tour, dist = self.tour, self.dist
+        n = len(tour)
+        for length in range(1, min(OR_OPT_LENGTH, n - 3) + 1):
+            for starts_at_a in (True, False):
+                if length == 1 and not starts_at_a:
+                    continue
+                # segment s1..s2 in forward direction, a is one of its ends
+                segment = [a]
+                for _ in range(length - 1):
+                    if starts_at_a:
+                        segment.append(tour.next(segment[-1]))
+                    else:
+                        segment.insert(0, tour.prev(segment[0]))
+                s1, s2 = segment[0], segment[-1]
+                p, q = tour.prev(s1), tour.next(s2)
+                removed = dist[p, s1] + dist[s2, q] - dist[p, q]
+                if removed <= EPSILON:
+                    continue
+                for s in (s1, s2):
+                    for x in self.neighbors(s):
+                        d_sx = dist[s, x]
+                        if d_sx >= removed:
+                            if self.candidates is None:
+                                continue
+                            break
+                        if x in segment:
+                            continue
+                        for c, e in ((x, tour.next(x)), (tour.prev(x), x)):
+                            if c in segment or e in segment:
+                                continue
+                            self.evaluated += 1
+                            # s sits next to x, which fixes the orientation
+                            keep = (s == s1) == (c == x) if length > 1 else True
+                            if keep:
+                                added = dist[c, s1] + dist[s2, e] - dist[c, e]
+                            else:
+                                added = dist[c, s2] + dist[s1, e] - dist[c, e]
+                            gain = removed - added
+                            if gain > EPSILON:
+                                self.move_segment(s1, s2, p, q, c, keep)
+                                if keep:
+                                    self.rekey((p, s1), (s2, q), (c, e), (p, q), (c, s1), (s2, e))
+                                else:
+                                    self.rekey((p, s1), (s2, q), (c, e), (p, q), (c, s2), (s1, e))
+                                self.activate(p, q, c, e, s1, s2)
+                                return gain
+        return 0
+
+    def move_segment(self, s1, s2, p, q, c, keep):
+        """p s1..s2 q .. c e --> p q .. c s1..s2 e (or s2..s1 if not keep)"""
+        tour = self.tour
+        # p s1..s2 q..c e --> p c..q s2..s1 e
+        tour.reverse(s1, c)
+        if c != q:
+            # p c..q s2..s1 e --> p q..c s2..s1 e
+            self.reverse_between(c, q, p)
+        if keep and s1 != s2:
+            self.reverse_between(s2, s1, c)
+
+    def or_3opt(self, a):
+        """Segment insertion: a b..c d..e f --> a d..e b..c f,
+        the new edges a-d and e-b come from the candidates of a and b"""
+        tour, dist = self.tour, self.dist
+        b = tour.next(a)
+        d_ab = dist[a, b]
+        for d in self.neighbors(a):
+            d_ad = dist[a, d]
+            if d_ad >= d_ab:
+                if self.candidates is None:
+                    continue
+                break
+            if d == a or d == b:
+                continue
+            c = tour.prev(d)
+            g1 = d_ab + dist[c, d] - d_ad
+            for e in self.neighbors(b):
+                d_be = dist[b, e]
+                if d_be >= g1:
+                    if self.candidates is None:
+                        continue
+                    break
+                f = tour.next(e)
+                # e has to lie on d..(before a) with f != a
+                if e == a or f == a or not tour.between(d, e, a):
+                    continue
+                self.evaluated += 1
+                gain = g1 + dist[e, f] - d_be - dist[c, f]
+                if gain > EPSILON:
+                    # a b..c d..e f --> a e..d c..b f --> a d..e b..c f
+                    tour.reverse(b, e)
+                    self.reverse_between(e, d, a)
+                    self.reverse_between(c, b, e)
+                    self.rekey((a, b), (c, d), (e, f), (a, d), (e, b), (c, f))
+                    self.activate(a, b, c, d, e, f)
+                    return gain
+        return 0
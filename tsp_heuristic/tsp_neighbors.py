@@ -0,0 +1,103 @@
+# -*- coding: utf-8 -*-
+
+import numpy
+
+try:
+    from scipy.spatial import cKDTree
+except ImportError:
+    cKDTree = None
+
+NEIGHBOR_INDEXES = ('grid', 'kdtree')
+# average number of cities per grid cell
+GRID_CELL_LOAD = 2.0
+
+
+def build_neighbor_lists(data, k, index='grid'):
+    """k nearest neighbors of every city as (n, k) int32 array sorted by distance"""
+    coords = numpy.asarray(data, dtype=numpy.float64)
+    n = len(coords)
+    k = min(k, n - 1)
+    if k < 1:
+        return numpy.empty((n, 0), dtype=numpy.int32)
+    if index == 'grid':
+        return grid_neighbors(coords, k)
+    elif index == 'kdtree':
+        return kdtree_neighbors(coords, k)
+    raise ValueError("Unknown neighbor index '{0}', use one of {1}".format(index, NEIGHBOR_INDEXES))
+
+
+def matrix_neighbors(matrix, k):
+    """k nearest neighbors read from a full distance matrix, row by row"""
+    n = len(matrix)
+    k = min(k, n - 1)
+    neighbors = numpy.empty((n, k), dtype=numpy.int32)
+    for start in range(0, n, 256):
+        rows = numpy.array(matrix[start:start + 256], dtype=numpy.float64)
+        rows[numpy.arange(len(rows)), numpy.arange(start, start + len(rows))] = numpy.inf
+        nearest = numpy.argpartition(rows, k - 1, axis=1)[:, :k]
+        ranked = numpy.argsort(rows[numpy.arange(len(rows))[:, None], nearest], axis=1)
+        neighbors[start:start + len(rows)] = nearest[numpy.arange(len(rows))[:, None], ranked]
+    return neighbors
+
+
+def kdtree_neighbors(coords, k):
+    if cKDTree is None:
+        raise ImportError("Neighbor index 'kdtree' requires scipy")
+    # the closest hit is the city itself
+    _, idx = cKDTree(coords).query(coords, k + 1)
+    return strip_self(idx, k)
+
+
+def grid_neighbors(coords, k):
+    """Bucket the cities into a uniform grid and search growing rings of cells
+    around each cell until the k-th neighbor of every city in it is certain."""
+    n = len(coords)
+    lower = coords.min(axis=0)
+    extent = coords.max(axis=0) - lower
+    # cells of GRID_CELL_LOAD cities on average, but never more cells along
+    # the longer axis than cities: a (nearly) collinear instance has almost
+    # no area and would otherwise get a huge grid of empty cells
+    cell_size = max(numpy.sqrt(extent[0] * extent[1] * GRID_CELL_LOAD / n), extent.max() * GRID_CELL_LOAD / n)
+    if cell_size <= 0:
+        # all cities at one point
+        cell_size = 1.0
+    nx, ny = (numpy.floor(extent / cell_size).astype(numpy.int64) + 1)
+    cx = numpy.minimum(((coords[:, 0] - lower[0]) / cell_size).astype(numpy.int64), nx - 1)
+    cy = numpy.minimum(((coords[:, 1] - lower[1]) / cell_size).astype(numpy.int64), ny - 1)
+    cell = cy * nx + cx
+    order = numpy.argsort(cell, kind='mergesort')
+    starts = numpy.searchsorted(cell[order], numpy.arange(nx * ny + 1))
+
+    neighbors = numpy.empty((n, k), dtype=numpy.int32)
+    for c in numpy.unique(cell):
+        members = order[starts[c]:starts[c + 1]]
+        x, y = c % nx, c // nx
+        r = 1
+        while True:
+            x0, x1 = max(x - r, 0), min(x + r, nx - 1)
+            rows = range(max(y - r, 0), min(y + r, ny - 1) + 1)
+            candidates = numpy.concatenate([order[starts[row * nx + x0]:starts[row * nx + x1 + 1]] for row in rows])
+            covers_all = x0 == 0 and x1 == nx - 1 and rows[0] == 0 and rows[-1] == ny - 1
+            if len(candidates) > k:
+                diff = coords[members][:, None, :] - coords[candidates][None, :, :]
+                dist = numpy.sqrt((diff ** 2).sum(axis=2))
+                dist[members[:, None] == candidates[None, :]] = numpy.inf
+                nearest = numpy.argpartition(dist, k - 1, axis=1)[:, :k]
+                kth = dist[numpy.arange(len(members))[:, None], nearest]
+                # everything inside the ring is at least r cells away
+                if covers_all or kth.max() <= r * cell_size:
+                    ranked = numpy.argsort(kth, axis=1)
+                    neighbors[members] = candidates[nearest[numpy.arange(len(members))[:, None], ranked]]
+                    break
+            r += 1
+    return neighbors
+
+
+def strip_self(idx, k):
+    """drop each city from its own neighbor list (duplicate points may come first)"""
+    n = len(idx)
+    rows = numpy.arange(n)[:, None]
+    keep = idx != rows
+    # rows where the city itself was not returned lose their last entry instead
+    keep[keep.all(axis=1), -1] = False
+    return idx[keep].reshape(n, k).astype(numpy.int32)
@@ -0,0 +1,180 @@
+# -*- coding: utf-8 -*-
+
+import os
+import ctypes
+import random
+import traceback
+import multiprocessing
+from Queue import Empty
+import numpy
+from datetime import datetime, timedelta
+
+# a worker whose current tour is this much worse than the global best restarts from it
+STRAGGLER_TOLERANCE = 0.01
+# iterations between two exchanges of the global best tour
+EXCHANGE_INTERVAL = 10
+# shared distance before any worker published a tour
+NO_DISTANCE = 2 ** 62
+# seconds between two checks for workers that died without a result
+RESULT_POLL = 1.0
+
+
+class BestExchange(object):
+    """Global best tour shared between worker processes.
+    Lives in shared memory, workers publish improvements and stragglers
+    adopt the global best every exchange_interval iterations, with the
+    iteration and runtime at which its finder reached it."""
+
+    def __init__(self, dimension, exchange_interval=EXCHANGE_INTERVAL, straggler_tolerance=STRAGGLER_TOLERANCE):
+        self.lock = multiprocessing.Lock()
+        # tour lengths are integral for every TSPLIB edge weight type
+        self.distance = multiprocessing.RawValue(ctypes.c_longlong, NO_DISTANCE)
+        self.tour = multiprocessing.RawArray('i', dimension)
+        self.iteration = multiprocessing.RawValue(ctypes.c_long, 0)
+        self.runtime = multiprocessing.RawValue(ctypes.c_double, 0.0)
+        self.exchange_interval = exchange_interval
+        self.straggler_tolerance = straggler_tolerance
+        self.adoptions = 0
+
+    def __call__(self, iteration, solution):
+        if iteration % self.exchange_interval:
+            return solution
+        with self.lock:
+            if solution['distance'] < self.distance.value:
+                self.distance.value = solution['distance']
+                self.tour[:] = solution['tour']
+                self.iteration.value = solution['iteration']
+                self.runtime.value = solution['runtime'].total_seconds()
+                return solution
+            if solution['distance'] > self.distance.value * (1 + self.straggler_tolerance):
+                self.adoptions += 1
+                adopted = dict(solution)
+                adopted['tour'] = list(self.tour)
+                adopted.pop('key', None)
+                adopted['distance'] = self.distance.value
+                adopted['iteration'] = self.iteration.value
+                adopted['runtime'] = timedelta(seconds=self.runtime.value)
+                return adopted
+        return solution
+
+
+def ils_worker(file_path, parameters, seed, exchange, stop_event, results):
+    """puts the stats of one trajectory on results, or {'seed', 'error'} if it failed"""
+    try:
+        stats = run_worker(file_path, parameters, seed, exchange, stop_event)
+    except Exception:
+        results.put({'seed': seed, 'error': traceback.format_exc()})
+        return
+    results.put(stats)
+
+
+def run_worker(file_path, parameters, seed, exchange, stop_event):
+    # tsp_solver imports this module
+    from tsp_solver import Solver
+
+    random.seed(seed)
+    numpy.random.seed(seed)
+    solver = Solver(file_path)
+    solver.setParameters(**parameters)
+    solver.prepare()
+    solver.reset()
+    solver.exchange = exchange
+    solver.stop_event = stop_event
+
+    start = datetime.now()
+    best = solver.iterated_local_search(solver.iteration_limit, solver.idle_limit, start)
+    exchange(0, best)
+    return {'seed': seed,
+                 'pid': os.getpid(),
+                 'tour': list(best['tour']),
+                 'distance': best['distance'],
+                 'iteration': best['iteration'],
+                 'runtime': best['runtime'],
+                 'total-runtime': datetime.now() - start,
+                 'iterations': solver.iterations,
+                 'adoptions': exchange.adoptions,
+                 'stop-reason': solver.stop_reason,
+                 'starter-runtime': solver.starter_runtime,
+                 'starter-distance': solver.starter_distance,
+                 'moves-evaluated': solver.moves_evaluated,
+                 'moves-applied': solver.moves_applied,
+                 'improvements': solver.improvements,
+                 'phase-seconds': solver.profiler.seconds,
+                 'cache-counts': [solver.starts.hits, solver.starts.misses,
+                                  solver.optima.hits, solver.optima.misses]}
+
+
+def run_parallel(solver, workers, seed=None):
+    """Run independent ILS trajectories in worker processes.
+    Distance matrix, coordinates and neighbor lists reach the workers as
+    memory-mapped files from the instance cache instead of being pickled.
+    solver.cancel() stops all workers through a shared event.
+    Returns the best solution and the per-worker stats."""
+    if solver.cache is None:
+        raise ValueError("Parallel runs share the instance data through the cache, enable it")
+    # fill the cache once so workers only map it
+    solver.prepare()
+
+    if seed is None:
+        seed = random.SystemRandom().randint(0, 2 ** 31 - 1)
+    parameters = solver.parameters()
+    parameters['workers'] = 1
+    exchange = BestExchange(solver.dimension)
+    solver.stop_event = multiprocessing.Event()
+    if solver.cancelled:
+        solver.stop_event.set()
+    results = multiprocessing.Queue()
+    processes = [multiprocessing.Process(target=ils_worker,
+                                         args=(solver.file_path, parameters, seed + i, exchange,
+                                               solver.stop_event, results))
+                 for i in range(workers)]
+    for process in processes:
+        process.daemon = True
+        process.start()
+    try:
+        stats = collect_stats(processes, results)
+    except Exception:
+        solver.stop_event.set()
+        for process in processes:
+            process.terminate()
+        raise
+    finally:
+        for process in processes:
+            process.join()
+
+    stats.sort(key=lambda s: s['seed'])
+    best = min(stats, key=lambda s: s['distance'])
+    solution = {'tour': best['tour'],
+                'distance': best['distance'],
+                'iteration': best['iteration'],
+                'runtime': best['runtime']}
+    return solution, stats
+
+
+def collect_stats(processes, results):
+    """stats of all workers, raises RuntimeError if one of them failed or
+    died without a result"""
+    stats = []
+    while len(stats) < len(processes):
+        try:
+            worker = results.get(timeout=RESULT_POLL)
+        except Empty:
+            for process in processes:
+                if process.exitcode not in (None, 0):
+                    raise RuntimeError("Worker process {0} died with exit code {1}".format(
+                        process.pid, process.exitcode))
+            continue
+        if 'error' in worker:
+            raise RuntimeError("Worker with seed {0} failed:\n{1}".format(worker['seed'], worker['error']))
+        stats.append(worker)
+    return stats
+
+
+def merge_improvements(stats):
+    """improvements of the global best from the per-worker ones, (seconds,
+    iteration, distance) in time order with the worker's iteration"""
+    merged = []
+    for seconds, iteration, distance in sorted(sum((s['improvements'] for s in stats), [])):
+        if not merged or distance < merged[-1][2]:
+            merged.append((seconds, iteration, distance))
+    return merged
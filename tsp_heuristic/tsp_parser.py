@@ -0,0 +1,110 @@
+# -*- coding: utf-8 -*-
+
+import re
+import numpy
+from collections import OrderedDict
+
+DATA_SECTIONS = ('NODE_COORD_SECTION', 'EDGE_WEIGHT_SECTION')
+EDGE_WEIGHT_TYPES = ('EUC_2D', 'CEIL_2D', 'ATT', 'GEO', 'EXPLICIT')
+EDGE_WEIGHT_FORMATS = ('FULL_MATRIX', 'UPPER_ROW', 'LOWER_ROW', 'UPPER_DIAG_ROW', 'LOWER_DIAG_ROW')
+# first line of the next section or EOF ends a numeric block
+SECTION_END = re.compile(r"^\s*[A-Za-z_]{2,}", re.M)
+
+
+def read_tsplib(file_path):
+    """Parse a TSPLIB file.
+    Returns the header as OrderedDict with lower case keys and values, the
+    coordinates as (n, 2) float64 array (or None) and for EXPLICIT instances
+    the full (n, n) weight matrix (otherwise None)."""
+    with open(file_path, 'r') as f:
+        return parse_tsplib(f, file_path)
+
+
+def parse_tsplib(f, source='instance'):
+    """read_tsplib for an open file or StringIO, source names it in errors"""
+    meta = OrderedDict()
+    sections = {}
+    # header keywords are scanned line by line until the first section
+    for line in iter(f.readline, ''):
+        keyword = line.split(':')[0].strip().upper()
+        if keyword.endswith('_SECTION') or keyword == 'EOF':
+            break
+        elif ':' in line:
+            key, value = line.split(':', 1)
+            meta[key.strip().lower()] = value.strip().lower()
+    else:
+        keyword = 'EOF'
+    body = f.read()
+
+    # numeric blocks are bulk-loaded up to the next keyword line
+    while keyword != 'EOF':
+        match = SECTION_END.search(body)
+        block_end = match.start() if match else len(body)
+        sections[keyword] = numpy.fromstring(body[:block_end], sep=' ')
+        if not match:
+            break
+        line_end = body.find('\n', block_end)
+        keyword = body[block_end:line_end if line_end >= 0 else len(body)].split(':')[0].strip().upper()
+        body = body[line_end + 1:] if line_end >= 0 else ''
+
+    if not any(section in sections for section in DATA_SECTIONS):
+        raise ValueError("{0} has no NODE_COORD_SECTION or EDGE_WEIGHT_SECTION".format(source))
+    weight_type = meta.get('edge_weight_type', 'euc_2d').upper()
+    if weight_type not in EDGE_WEIGHT_TYPES:
+        raise ValueError("Unsupported EDGE_WEIGHT_TYPE '{0}'".format(weight_type))
+    if 'dimension' not in meta:
+        raise ValueError("{0} has no DIMENSION".format(source))
+    try:
+        dimension = int(meta['dimension'])
+    except ValueError:
+        raise ValueError("{0} has an invalid DIMENSION '{1}'".format(source, meta['dimension']))
+
+    coords = None
+    for section in ('NODE_COORD_SECTION', 'DISPLAY_DATA_SECTION'):
+        if section in sections:
+            if len(sections[section]) < dimension * 3:
+                raise ValueError("{0} has fewer than {1} cities in its {2}".format(source, dimension, section))
+            coords = sections[section][:dimension * 3].reshape(dimension, 3)[:, 1:3].copy()
+            break
+
+    weights = None
+    if weight_type == 'EXPLICIT':
+        if 'EDGE_WEIGHT_SECTION' not in sections:
+            raise ValueError("{0} has EDGE_WEIGHT_TYPE EXPLICIT but no EDGE_WEIGHT_SECTION".format(source))
+        weights = expand_weights(sections['EDGE_WEIGHT_SECTION'], dimension,
+                                 meta.get('edge_weight_format', 'full_matrix').upper())
+    return meta, coords, weights
+
+
+def expand_weights(values, n, weight_format):
+    if weight_format not in EDGE_WEIGHT_FORMATS:
+        raise ValueError("Unsupported EDGE_WEIGHT_FORMAT '{0}'".format(weight_format))
+    weights = numpy.zeros((n, n), dtype=numpy.int32)
+    if weight_format == 'FULL_MATRIX':
+        weights[:] = values[:n * n].reshape(n, n)
+        return weights
+    # triangles are listed row by row, which is the order of triu/tril_indices
+    diagonal = weight_format.endswith('DIAG_ROW')
+    if weight_format.startswith('UPPER'):
+        rows, cols = numpy.triu_indices(n, 0 if diagonal else 1)
+    else:
+        rows, cols = numpy.tril_indices(n, 0 if diagonal else -1)
+    weights[rows, cols] = values[:len(rows)]
+    weights[cols, rows] = values[:len(rows)]
+    return weights
+
+
+def read_tour(file_path):
+    """0-based city order of a TSPLIB .tour file"""
+    with open(file_path, 'r') as f:
+        for line in iter(f.readline, ''):
+            if line.strip().upper().startswith('TOUR_SECTION'):
+                break
+        body = f.read()
+    match = SECTION_END.search(body)
+    values = numpy.fromstring(body[:match.start() if match else len(body)], sep=' ').astype(numpy.int64)
+    # the tour is terminated by -1
+    end = numpy.flatnonzero(values < 0)
+    if len(end):
+        values = values[:end[0]]
+    return (values - 1).tolist()
@@ -0,0 +1,120 @@
+# -*- coding: utf-8 -*-
+"""Phase timers, counters and an opt-in cProfile hook for the solver.
+
+Set TSP_PROFILE=1 (or pass --profile to tsp_cli.py) to write a cProfile
+dump of every solve to log/profile/, which also works for GUI runs.
+"""
+
+import os
+import cProfile
+import pstats
+from contextlib import contextmanager
+from timeit import default_timer
+
+try:
+    import resource
+except ImportError:
+    # not available on Windows
+    resource = None
+
+PHASES = ('construction', 'perturbation', 'local_search', 'distance', 'logging', 'drawing')
+TRACE_HEADER = "iteration;seconds;candidate-distance;current-distance;accepted;moves-evaluated;moves-applied;" \
+               "perturbation-seconds;local-search-seconds;peak-memory"
+# functions listed after a profiled run
+PROFILE_TOP = 20
+
+
+def peak_memory():
+    """peak resident memory of this process in bytes, None if unknown"""
+    if resource is None:
+        return None
+    # kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def profiling_requested():
+    return os.environ.get('TSP_PROFILE', '') not in ('', '0')
+
+
+class Profiler(object):
+    """Wall time per phase of a run plus an optional per-iteration trace file"""
+
+    def __init__(self, trace_path=None):
+        self.started = default_timer()
+        self.seconds = dict.fromkeys(PHASES, 0.0)
+        self.trace = None
+        if trace_path is not None:
+            directory = os.path.dirname(trace_path)
+            if directory and not os.path.isdir(directory):
+                os.makedirs(directory)
+            self.trace = open(trace_path, 'w')
+            self.trace.write(TRACE_HEADER + '\n')
+        self.last = dict(self.seconds)
+
+    @contextmanager
+    def phase(self, name):
+        started = default_timer()
+        try:
+            yield
+        finally:
+            self.seconds[name] += default_timer() - started
+
+    def elapsed(self):
+        return default_timer() - self.started
+
+    def snapshot(self, solver):
+        """telemetry handed to the progress callback"""
+        elapsed = self.elapsed()
+        return {'elapsed': elapsed,
+                'phases': dict(self.seconds),
+                'moves_evaluated': solver.moves_evaluated,
+                'moves_applied': solver.moves_applied,
+                'improvements_per_second': len(solver.improvements) / elapsed if elapsed else 0.0,
+                'peak_memory': peak_memory()}
+
+    def iteration(self, solver, iteration, candidate, current, accepted):
+        """one trace line with the phase times spent since the last one"""
+        if self.trace is None:
+            return
+        perturbation = self.seconds['perturbation'] - self.last['perturbation']
+        local_search = self.seconds['local_search'] - self.last['local_search']
+        self.last = dict(self.seconds)
+        self.trace.write(";".join([str(iteration),
+                                   "{0:.6f}".format(self.elapsed()),
+                                   str(candidate['distance']),
+                                   str(current['distance']),
+                                   str(accepted),
+                                   str(solver.moves_evaluated),
+                                   str(solver.moves_applied),
+                                   "{0:.6f}".format(perturbation),
+                                   "{0:.6f}".format(local_search),
+                                   str(peak_memory())]) + '\n')
+
+    def summary(self):
+        """phase=seconds pairs for the run log"""
+        return "|".join("{0}={1:.3f}".format(name, self.seconds[name]) for name in PHASES)
+
+    def close(self):
+        if self.trace is not None:
+            self.trace.close()
+            self.trace = None
+
+
+@contextmanager
+def profiled(path):
+    """cProfile the block and dump the stats to path, None disables it"""
+    if path is None:
+        yield
+        return
+    directory = os.path.dirname(path)
+    if directory and not os.path.isdir(directory):
+        os.makedirs(directory)
+    profile = cProfile.Profile()
+    profile.enable()
+    try:
+        yield
+    finally:
+        profile.disable()
+        profile.dump_stats(path)
+        print "profile written to {0}".format(path)
+        pstats.Stats(path).sort_stats('cumulative').print_stats(PROFILE_TOP)
@@ -0,0 +1,111 @@
+# -*- coding: utf-8 -*-
+"""Tour drawing for the GUI. The cities are one scatter and the tour one
+LineCollection, both created once per problem; showing another tour only
+replaces the segments of the collection. Tours of more than MAX_SEGMENTS
+cities are decimated to every k-th city along the tour. Saving the figure
+happens on a background thread on its own Agg figure, so the GUI thread
+never waits for a PNG to be written."""
+
+import os
+import threading
+from Queue import Queue
+import numpy
+from matplotlib.collections import LineCollection
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+# segments drawn per tour, larger tours are decimated
+MAX_SEGMENTS = 5000
+# cities drawn as points, larger instances show every k-th city
+MAX_POINTS = 5000
+
+
+def decimate(n, limit):
+    """stride showing at most limit of n items"""
+    return max(1, -(-n // limit))
+
+
+def tour_segments(coords, tour, limit=MAX_SEGMENTS):
+    """(m, 2, 2) array of the closed tour's segments, at most limit of them"""
+    tour = numpy.asarray(tour)
+    points = coords[tour[::decimate(len(tour), limit)]]
+    return numpy.stack([points, numpy.roll(points, -1, axis=0)], axis=1)
+
+
+def setup_axes(ax, coords, name):
+    ax.set_title(name)
+    ax.set_xlabel('X-Axis')
+    ax.set_ylabel('Y-Axis')
+    points = coords[::decimate(len(coords), MAX_POINTS)]
+    ax.scatter(points[:, 0], points[:, 1], s=4, c='k', linewidths=0, zorder=2)
+    edges = LineCollection([], linewidths=0.5, colors='r', zorder=1)
+    ax.add_collection(edges)
+    low, high = coords.min(axis=0), coords.max(axis=0)
+    margin = 0.02 * (high - low)
+    ax.set_xlim(min(0, low[0] - margin[0]), high[0] + margin[0])
+    ax.set_ylim(min(0, low[1] - margin[1]), high[1] + margin[1])
+    return edges
+
+
+class TourRenderer(object):
+    """Draws tours of one problem at a time into figure"""
+
+    def __init__(self, figure, canvas):
+        self.figure = figure
+        self.canvas = canvas
+        self.coords = None
+        self.name = None
+        self.edges = None
+        self.exporter = FigureExporter()
+
+    def draw(self, coords, tour, name, path=None):
+        """show tour, then save the figure to path in the background"""
+        if coords is None:
+            # EXPLICIT instances have nothing to draw
+            return
+        if coords is not self.coords:
+            self.figure.clear()
+            ax = self.figure.add_subplot(111)
+            self.edges = setup_axes(ax, coords, name)
+            self.figure.tight_layout(pad=1.2)
+            self.coords, self.name = coords, name
+        segments = tour_segments(coords, tour)
+        self.edges.set_segments(segments)
+        self.canvas.draw_idle()
+        if path is not None:
+            self.exporter.submit(path, coords, segments, name)
+
+
+class FigureExporter(object):
+    """Background thread writing figures, only the latest pending one is kept"""
+
+    def __init__(self):
+        self.jobs = Queue()
+        self.thread = None
+
+    def submit(self, path, coords, segments, name):
+        self.jobs.put((path, coords, segments, name))
+        if self.thread is None:
+            self.thread = threading.Thread(target=self.run, name='figure-export')
+            self.thread.daemon = True
+            self.thread.start()
+
+    def run(self):
+        while True:
+            job = self.jobs.get()
+            while not self.jobs.empty():
+                job = self.jobs.get()
+            save_figure(*job)
+
+
+def save_figure(path, coords, segments, name):
+    # a figure of its own, pyplot state is not thread-safe
+    figure = Figure()
+    FigureCanvasAgg(figure)
+    edges = setup_axes(figure.add_subplot(111), coords, name)
+    edges.set_segments(segments)
+    figure.tight_layout(pad=1.2)
+    directory = os.path.dirname(path)
+    if directory and not os.path.isdir(directory):
+        os.makedirs(directory)
+    figure.savefig(path)
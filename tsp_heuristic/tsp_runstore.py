@@ -0,0 +1,351 @@
+# -*- coding: utf-8 -*-
+"""Run store: one compressed .npz per solver run in log/runs/<instance>/.
+
+A run holds a typed record (RUN_DTYPE), the convergence trace of the run
+(distance, runtime and acceptance per iteration, the improvements of the
+best solution and the seconds per profiler phase) and a JSON info with
+the parameters, seed and git revision. The query functions work on the
+record table and on the traces:
+
+    python tsp_runstore.py import ../log/*.csv
+    python tsp_runstore.py summary berlin52 ch150
+    python tsp_runstore.py ttt berlin52 --target 7700
+"""
+
+import os
+import sys
+import json
+import argparse
+import subprocess
+from glob import glob
+from datetime import datetime, timedelta
+from collections import OrderedDict
+import numpy
+
+from tsp_cache import ROOT_DIR, write_atomic
+from tsp_profile import PHASES, peak_memory
+
+RUNS_DIR = os.path.join(ROOT_DIR, 'log', 'runs')
+# missing integers are stored as -1, missing floats as nan
+RUN_DTYPE = numpy.dtype([('timestamp', 'datetime64[us]'),
+                         ('instance', 'S64'),
+                         ('engine', 'S64'),
+                         ('dimension', numpy.int64),
+                         ('seed', numpy.int64),
+                         ('runtime', numpy.float64),
+                         ('runtime_til_best', numpy.float64),
+                         ('iterations', numpy.int64),
+                         ('best_iteration', numpy.int64),
+                         ('distance', numpy.int64),
+                         ('starter_runtime', numpy.float64),
+                         ('starter_distance', numpy.int64),
+                         ('start_hit_rate', numpy.float64),
+                         ('optimum_hit_rate', numpy.float64),
+                         ('moves_evaluated', numpy.int64),
+                         ('moves_applied', numpy.int64),
+                         ('peak_memory', numpy.int64),
+                         ('stop_reason', 'S16')])
+RUN_FILE_FORMAT = '%Y%m%d-%H%M%S-%f'
+
+
+def seconds(value):
+    """timedelta, its str() as in the CSV logs, a number or None as float seconds"""
+    if value is None or value in ('', 'None'):
+        return numpy.nan
+    if isinstance(value, timedelta):
+        return value.total_seconds()
+    if isinstance(value, basestring) and ':' in value:
+        days = 0
+        if ' day' in value:
+            days, value = value.split(' day', 1)
+            days, value = int(days), value.split(', ', 1)[1]
+        hours, minutes, rest = value.split(':')
+        return days * 86400 + int(hours) * 3600 + int(minutes) * 60 + float(rest)
+    return float(value)
+
+
+def engine_name(parameters):
+    """short name of the search setup, e.g. oropt-k8-annealing-local or alt100-b64best"""
+    if parameters['alternative']:
+        engine = 'alt{0}'.format(parameters['idle_limit'])
+        if parameters.get('alt_batch', 1) > 1:
+            engine += '-b{0}{1}'.format(parameters['alt_batch'], parameters.get('alt_pick', 'best'))
+    else:
+        engine = parameters.get('local_search_mode', '2opt')
+    if parameters.get('neighbor_k'):
+        engine += '-k{0}'.format(parameters['neighbor_k'])
+    if parameters.get('workers', 1) > 1:
+        engine += '-w{0}'.format(parameters['workers'])
+    if parameters.get('decompose_window'):
+        engine += '-d{0}'.format(parameters['decompose_window'])
+    if parameters.get('acceptance', 'better') != 'better':
+        engine += '-' + parameters['acceptance']
+    if parameters.get('kick', 'random') != 'random':
+        engine += '-' + parameters['kick']
+    return engine
+
+
+_revision = []
+
+
+def git_revision():
+    """commit of the working tree, None outside a git checkout"""
+    if not _revision:
+        try:
+            with open(os.devnull, 'w') as devnull:
+                _revision.append(subprocess.check_output(['git', 'rev-parse', 'HEAD'], cwd=ROOT_DIR,
+                                                         stderr=devnull).strip())
+        except (OSError, subprocess.CalledProcessError):
+            _revision.append(None)
+    return _revision[0]
+
+
+def new_record(**fields):
+    record = numpy.zeros((), dtype=RUN_DTYPE)
+    for name in RUN_DTYPE.names:
+        kind = RUN_DTYPE[name].kind
+        record[name] = numpy.nan if kind == 'f' else -1 if kind == 'i' else record[name]
+    for name, value in fields.items():
+        if value is None:
+            continue
+        record[name] = seconds(value) if RUN_DTYPE[name].kind == 'f' else value
+    return record
+
+
+def solver_run(solver, start):
+    """(record, info, arrays) of the run the solver just finished"""
+    parameters = solver.parameters()
+    best = solver.best_solution
+    memory = peak_memory()
+    record = new_record(timestamp=numpy.datetime64(start, 'us'),
+                        instance=solver.meta['name'],
+                        engine=engine_name(parameters),
+                        dimension=solver.dimension,
+                        seed=solver.seed,
+                        runtime=solver.runtime,
+                        runtime_til_best=best['runtime'],
+                        iterations=solver.iterations,
+                        best_iteration=best['iteration'],
+                        distance=best['distance'],
+                        starter_runtime=solver.starter_runtime,
+                        starter_distance=solver.starter_distance,
+                        start_hit_rate=solver.starts.hit_rate(),
+                        optimum_hit_rate=solver.optima.hit_rate(),
+                        moves_evaluated=solver.moves_evaluated,
+                        moves_applied=solver.moves_applied,
+                        peak_memory=memory,
+                        stop_reason=solver.stop_reason)
+    workers = [dict((key, seconds(value) if isinstance(value, timedelta) else value)
+                    for key, value in stats.items() if key not in ('tour', 'improvements'))
+               for stats in solver.worker_stats]
+    info = {'parameters': parameters,
+            'file_path': solver.file_path,
+            'figure': os.path.basename(solver.img),
+            'revision': git_revision(),
+            'workers': workers}
+    improvements = numpy.array(solver.improvements, dtype=numpy.float64).reshape(-1, 3)
+    arrays = {'trace_distance': solver.history.distances(),
+              'trace_runtime': solver.history.runtimes(),
+              'trace_accepted': solver.history.acceptances(),
+              'improvements': improvements,
+              'phase_seconds': numpy.array([solver.profiler.seconds[name] for name in PHASES])}
+    return record, info, arrays
+
+
+class Run(object):
+    """One stored run, its trace arrays are loaded on first access"""
+
+    def __init__(self, path, record, info):
+        self.path = path
+        self.record = record
+        self.info = info
+        self.arrays = None
+
+    def trace(self):
+        """trace_distance, trace_runtime, trace_accepted, improvements and
+        phase_seconds, empty for runs imported from CSV logs"""
+        if self.arrays is None:
+            with numpy.load(self.path) as data:
+                self.arrays = dict((name, data[name]) for name in data.files if name not in ('record', 'info'))
+        return self.arrays
+
+
+class RunStore(object):
+
+    def __init__(self, root=RUNS_DIR):
+        self.root = root
+
+    def path(self, record):
+        timestamp = record['timestamp'].item().strftime(RUN_FILE_FORMAT)
+        return os.path.join(self.root, str(record['instance']), timestamp + '.npz')
+
+    def save(self, record, info, arrays):
+        """store a run, returns its path. Runs already stored are kept."""
+        path = self.path(record)
+        if os.path.isfile(path):
+            return path
+        directory = os.path.dirname(path)
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        arrays = dict(arrays, record=record, info=numpy.array(json.dumps(info)))
+        write_atomic(path, lambda f: numpy.savez_compressed(f, **arrays))
+        return path
+
+    def paths(self, instance=None):
+        return sorted(glob(os.path.join(self.root, instance or '*', '*.npz')))
+
+    def runs(self, instance=None, engine=None):
+        """stored runs in timestamp order"""
+        runs = []
+        for path in self.paths(instance):
+            with numpy.load(path) as data:
+                record = data['record'][()]
+                if engine is not None and record['engine'] != engine:
+                    continue
+                runs.append(Run(path, record, json.loads(str(data['info']))))
+        runs.sort(key=lambda run: run.record['timestamp'])
+        return runs
+
+    def table(self, instance=None, engine=None):
+        """records of the stored runs as structured array"""
+        return numpy.array([run.record for run in self.runs(instance, engine)], dtype=RUN_DTYPE)
+
+
+def time_to_target(improvements, target):
+    """seconds until the best distance reached target, None if it never did.
+    improvements are (seconds, iteration, distance) rows."""
+    for seconds, _, distance in improvements:
+        if distance <= target:
+            return seconds
+    return None
+
+
+def ttt_distribution(runs, target):
+    """Empirical time-to-target distribution: sorted seconds of the runs
+    reaching target and their cumulative probability (i + 0.5) / len(runs),
+    so runs that never reach it lower the curve."""
+    times = [time_to_target(run.trace()['improvements'], target) for run in runs]
+    times = numpy.sort(numpy.array([t for t in times if t is not None], dtype=numpy.float64))
+    return times, (numpy.arange(len(times)) + 0.5) / max(len(runs), 1)
+
+
+def aggregate(table, value, by=('instance', 'engine'), reduce=numpy.mean):
+    """reduce value (a field name or a function of the table) per group,
+    returns an OrderedDict of group key -> result in sorted key order"""
+    values = table[value] if isinstance(value, basestring) else value(table)
+    keys = zip(*[table[name].tolist() for name in by]) if len(table) else []
+    groups = OrderedDict()
+    for key in sorted(set(keys)):
+        mask = numpy.array([k == key for k in keys])
+        groups[key] = reduce(values[mask])
+    return groups
+
+
+def iterations_per_second(table):
+    return aggregate(table, lambda t: t['iterations'] / t['runtime'])
+
+
+# columns of the old CSV logs, later ones were added over time
+CSV_FIELDS = {'total-runtime': 'runtime',
+              'runtime-til-best': 'runtime_til_best',
+              'iterations': 'iterations',
+              'best-iteration': 'best_iteration',
+              'tour-distance': 'distance',
+              'starter-runtime': 'starter_runtime',
+              'starter-distance': 'starter_distance',
+              'start-hit-rate': 'start_hit_rate',
+              'optimum-hit-rate': 'optimum_hit_rate',
+              'moves-evaluated': 'moves_evaluated',
+              'moves-applied': 'moves_applied',
+              'peak-memory': 'peak_memory',
+              'stop-reason': 'stop_reason'}
+
+
+def parse_timestamp(value):
+    for layout in ('%Y-%m-%d %H:%M:%S.%f', '%Y-%m-%d %H:%M:%S'):
+        try:
+            return datetime.strptime(value, layout)
+        except ValueError:
+            pass
+    raise ValueError("Unknown timestamp '{0}'".format(value))
+
+
+def import_csv(path, store):
+    """Add the runs of an old log/<name>.csv (or an archived
+    <name>.csv.<mtime>) to store, returns the number of rows read.
+    Rows already imported are skipped."""
+    instance = os.path.basename(path).split('.csv')[0]
+    if instance.endswith('_workers'):
+        raise ValueError("{0} holds worker runs, import the instance log instead".format(path))
+    with open(path, 'r') as f:
+        header = f.readline().rstrip('\r\n').split(';')
+        rows = [dict(zip(header, line.rstrip('\r\n').split(';'))) for line in f if line.strip()]
+    for row in rows:
+        value = lambda name: None if row.get(name) in (None, '', 'None') else row[name]
+        parameters = {'iteration_limit': int(row['iteration-limit']),
+                      'alternative': row['use-no-improve'] == 'True',
+                      'idle_limit': int(row['idle-limit']),
+                      'starter': row.get('starter', 'random')}
+        fields = dict((field, value(column)) for column, field in CSV_FIELDS.items())
+        for field in ('iterations', 'best_iteration', 'distance', 'starter_distance',
+                      'moves_evaluated', 'moves_applied', 'peak_memory'):
+            if fields[field] is not None:
+                # early logs wrote distances as floats
+                fields[field] = int(round(float(fields[field])))
+        record = new_record(timestamp=numpy.datetime64(parse_timestamp(row['timestamp']), 'us'),
+                            instance=instance,
+                            engine=engine_name(parameters),
+                            **fields)
+        info = {'parameters': parameters,
+                'figure': row.get('figure'),
+                'phases': row.get('phase-seconds'),
+                'imported_from': os.path.abspath(path)}
+        store.save(record, info, {})
+    return len(rows)
+
+
+def print_summary(table):
+    rates = iterations_per_second(table)
+    best = aggregate(table, 'distance', reduce=numpy.min)
+    mean = aggregate(table, 'distance')
+    counts = aggregate(table, 'distance', reduce=len)
+    print "instance;engine;runs;best;mean;iterations-per-second"
+    for key in counts:
+        print "{0};{1};{2};{3};{4:.1f};{5:.1f}".format(key[0], key[1], counts[key], best[key], mean[key], rates[key])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Stored solver runs")
+    parser.add_argument('--root', default=RUNS_DIR)
+    commands = parser.add_subparsers(dest='command')
+    importing = commands.add_parser('import', help="import old CSV logs")
+    importing.add_argument('paths', nargs='+')
+    summary = commands.add_parser('summary', help="runs, best and mean distance, iterations/s per engine")
+    summary.add_argument('instances', nargs='*')
+    ttt = commands.add_parser('ttt', help="time-to-target distribution")
+    ttt.add_argument('instance')
+    ttt.add_argument('--target', type=float, required=True)
+    ttt.add_argument('--engine', default=None)
+    args = parser.parse_args(sys.argv[1:] if argv is None else argv)
+
+    store = RunStore(args.root)
+    if args.command == 'import':
+        for path in args.paths:
+            try:
+                print "{0}: {1} runs".format(path, import_csv(path, store))
+            except (ValueError, KeyError) as e:
+                print "{0}: skipped ({1})".format(path, e)
+    elif args.command == 'summary':
+        tables = [store.table(instance) for instance in args.instances] or [store.table()]
+        print_summary(numpy.concatenate(tables))
+    else:
+        runs = [run for run in store.runs(args.instance, args.engine) if 'improvements' in run.trace()]
+        times, probabilities = ttt_distribution(runs, args.target)
+        print "seconds;probability"
+        for t, p in zip(times, probabilities):
+            print "{0:.6f};{1:.4f}".format(t, p)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
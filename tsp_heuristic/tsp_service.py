@@ -0,0 +1,438 @@
+# -*- coding: utf-8 -*-
+"""Local HTTP service solving submitted instances on a pool of processes.
+
+    python tsp_service.py --port 8642 --workers 2
+
+    POST /jobs              {"tsplib": "<file content>"} or
+                            {"coords": [[x, y], ...], "edge_weight_type": "euc_2d", "name": "..."},
+                            optional "parameters" (keyword arguments of Solver.setParameters)
+                            and "time_limit" in seconds
+    GET  /jobs/<id>         status, latest progress and the result once done
+    GET  /jobs/<id>/events  progress as JSON lines until the job ends
+
+A submission equal to an earlier one (same instance data and parameters)
+is answered from the result cache without solving it again. Finished jobs
+stay queryable for JOB_TTL seconds. ServiceClient talks to the service
+from Python,
+
+    python tsp_service.py --selftest
+
+runs it against a service on a free local port.
+"""
+
+import sys
+import time
+import json
+import uuid
+import inspect
+import hashlib
+import argparse
+import threading
+import urllib2
+import multiprocessing
+from Queue import Empty
+from collections import OrderedDict
+from StringIO import StringIO
+from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+from SocketServer import ThreadingMixIn
+import numpy
+
+from tsp_solver import Solver
+from tsp_parser import parse_tsplib, EDGE_WEIGHT_TYPES
+from tsp_hashing import LRUCache
+
+HOST = '127.0.0.1'
+PORT = 8642
+# jobs waiting for a worker, further submissions are refused with 503
+QUEUE_SIZE = 64
+# seconds per job if the submission sets none, and the most a job may take
+TIME_BUDGET = 60.0
+MAX_TIME_BUDGET = 600.0
+# finished results kept for repeated submissions
+RESULT_CACHE_SIZE = 256
+# seconds a finished job stays queryable, and the most finished jobs kept
+JOB_TTL = 3600.0
+MAX_FINISHED_JOBS = 1024
+# seconds a running job may exceed its time limit before it counts as lost
+# (its worker died or the result could not be sent back)
+JOB_GRACE = 30.0
+# seconds between two checks for failed and lost jobs
+WATCH_INTERVAL = 1.0
+# parameters of a submission that leaves them out, as tsp_cli.py
+DEFAULT_PARAMETERS = {'iteration_limit': 400, 'alternative': False, 'idle_limit': 100}
+# set by the service for every job
+FIXED_PARAMETERS = {'workers': 1, 'trace': False, 'profile': False,
+                    'checkpoint_interval': None, 'checkpoint_path': None}
+PARAMETER_NAMES = frozenset(inspect.getargspec(Solver.setParameters).args[1:]) - frozenset(FIXED_PARAMETERS)
+
+# progress queue of a pool process, see init_worker
+events = None
+
+
+def read_submission(submission):
+    """(meta, coordinates, weights) of a submitted instance"""
+    if not isinstance(submission, dict):
+        raise ValueError("Submission must be a JSON object")
+    if 'tsplib' in submission:
+        meta, coords, weights = parse_tsplib(StringIO(submission['tsplib']), 'submitted instance')
+        meta.setdefault('name', submission.get('name', 'submitted'))
+        return meta, coords, weights
+    if 'coords' not in submission:
+        raise ValueError("Submission needs 'tsplib' or 'coords'")
+    coords = numpy.array(submission['coords'], dtype=numpy.float64)
+    if coords.ndim != 2 or coords.shape[1] != 2 or len(coords) < 5:
+        raise ValueError("'coords' must be a list of at least 5 [x, y] pairs")
+    weight_type = submission.get('edge_weight_type', 'euc_2d').lower()
+    if weight_type.upper() not in EDGE_WEIGHT_TYPES or weight_type == 'explicit':
+        raise ValueError("Unsupported edge_weight_type '{0}'".format(weight_type))
+    meta = OrderedDict([('name', submission.get('name', 'submitted')),
+                        ('dimension', str(len(coords))),
+                        ('edge_weight_type', weight_type)])
+    return meta, coords, None
+
+
+def job_parameters(submission):
+    parameters = dict(DEFAULT_PARAMETERS)
+    if not isinstance(submission.get('parameters', {}), dict):
+        raise ValueError("'parameters' must be a JSON object")
+    unknown = set(submission.get('parameters', {})) - PARAMETER_NAMES
+    if unknown:
+        raise ValueError("Unknown parameters: {0}".format(", ".join(sorted(unknown))))
+    parameters.update(submission.get('parameters', {}))
+    budget = submission.get('time_limit', parameters.get('time_limit')) or TIME_BUDGET
+    parameters['time_limit'] = min(float(budget), MAX_TIME_BUDGET)
+    parameters.update(FIXED_PARAMETERS)
+    return parameters
+
+
+def job_key(instance, parameters):
+    """hash of the instance data and the parameters, the name does not count"""
+    meta, coords, weights = instance
+    sha = hashlib.sha1(meta.get('edge_weight_type', 'euc_2d').lower())
+    for array in (coords, weights):
+        if array is not None:
+            sha.update(numpy.ascontiguousarray(array).tostring())
+    sha.update(json.dumps(parameters, sort_keys=True))
+    return sha.hexdigest()
+
+
+def init_worker(queue):
+    global events
+    events = queue
+
+
+def solve_job(job_id, instance, parameters):
+    """run in a pool process, returns the result of the job or
+    {'error': message}, apply_async has no error callback in Python 2"""
+    def progress(iterations, solution, stats):
+        events.put((job_id, {'iterations': iterations,
+                             'distance': int(solution['distance']),
+                             'elapsed': stats['elapsed']}))
+
+    # no progress yet, but the job is running now
+    events.put((job_id, None))
+    try:
+        solver = Solver(None, progress=progress, instance=instance)
+        solver.setParameters(**parameters)
+        best = solver.solve()
+    except Exception as e:
+        return {'error': "{0}: {1}".format(type(e).__name__, e)}
+    return {'tour': [int(city) for city in best['tour']],
+            'distance': int(best['distance']),
+            'iterations': solver.iterations,
+            'best_iteration': best['iteration'],
+            'runtime': solver.runtime.total_seconds(),
+            'stop_reason': solver.stop_reason}
+
+
+class Job(object):
+
+    def __init__(self, key, name, time_limit):
+        self.id = uuid.uuid4().hex
+        self.key = key
+        self.name = name
+        self.time_limit = time_limit
+        self.status = 'queued'
+        self.progress = None
+        self.result = None
+        self.error = None
+        self.cached = False
+        # AsyncResult of the pool task, start and end time of the job
+        self.task = None
+        self.started = None
+        self.ended = None
+        # bumped by every update, event streams send each version at most once
+        self.version = 0
+        self.changed = threading.Condition()
+
+    def update(self, **fields):
+        with self.changed:
+            for name, value in fields.items():
+                setattr(self, name, value)
+            if self.status == 'running' and self.started is None:
+                self.started = time.time()
+            if self.status in ('done', 'failed') and self.ended is None:
+                self.ended = time.time()
+            self.version += 1
+            self.changed.notify_all()
+
+    def active(self):
+        return self.status in ('queued', 'running')
+
+    def describe(self):
+        return {'id': self.id, 'name': self.name, 'status': self.status, 'cached': self.cached,
+                'progress': self.progress, 'result': self.result, 'error': self.error}
+
+
+class SolverService(object):
+    """Job table, process pool and result cache behind the HTTP handler"""
+
+    def __init__(self, workers=1, queue_size=QUEUE_SIZE, cache_size=RESULT_CACHE_SIZE):
+        self.events = multiprocessing.Queue()
+        self.pool = multiprocessing.Pool(workers, init_worker, (self.events,))
+        self.queue_size = queue_size
+        self.results = LRUCache(cache_size)
+        self.jobs = {}
+        self.lock = threading.Lock()
+        self.collector = threading.Thread(target=self.collect_events, name='progress-events')
+        self.collector.daemon = True
+        self.collector.start()
+
+    def submit(self, submission):
+        """new or cached Job, raises ValueError for bad submissions and
+        RuntimeError when the queue is full"""
+        instance = read_submission(submission)
+        parameters = job_parameters(submission)
+        key = job_key(instance, parameters)
+        job = Job(key, instance[0]['name'], parameters['time_limit'])
+        self.evict()
+        with self.lock:
+            result = self.results.get(key)
+            if result is not None:
+                job.update(status='done', result=result, cached=True)
+            elif sum(other.status == 'queued' for other in self.jobs.values()) >= self.queue_size:
+                raise RuntimeError("Job queue is full")
+            self.jobs[job.id] = job
+        if result is None:
+            job.task = self.pool.apply_async(solve_job, (job.id, instance, parameters),
+                                             callback=lambda result: self.finished(job, result))
+        return job
+
+    def finished(self, job, result):
+        if 'error' in result:
+            job.update(status='failed', error=result['error'])
+            return
+        with self.lock:
+            self.results.put(job.key, result)
+        job.update(status='done', result=result)
+
+    def collect_events(self):
+        """progress of the pool processes, a job without progress just started"""
+        while True:
+            try:
+                job_id, progress = self.events.get(timeout=WATCH_INTERVAL)
+            except Empty:
+                self.watch()
+                continue
+            job = self.jobs.get(job_id)
+            if job is not None and job.active():
+                job.update(status='running', progress=progress or job.progress)
+
+    def watch(self):
+        """fail jobs whose task failed outside solve_job (the callback only
+        runs for results) or that outlived their time limit by JOB_GRACE,
+        so their event streams end"""
+        now = time.time()
+        for job in self.jobs.values():
+            if not job.active() or job.task is None:
+                continue
+            if job.task.ready() and not job.task.successful():
+                try:
+                    job.task.get()
+                except Exception as e:
+                    job.update(status='failed', error="{0}: {1}".format(type(e).__name__, e))
+            elif job.started is not None and now - job.started > job.time_limit + JOB_GRACE:
+                job.update(status='failed', error="Job exceeded its time limit, its worker was lost")
+        self.evict()
+
+    def evict(self):
+        """drop finished jobs after JOB_TTL seconds and beyond MAX_FINISHED_JOBS, oldest first"""
+        now = time.time()
+        with self.lock:
+            ended = sorted((job for job in self.jobs.values() if job.ended is not None), key=lambda job: job.ended)
+            for index, job in enumerate(ended):
+                if now - job.ended > JOB_TTL or index < len(ended) - MAX_FINISHED_JOBS:
+                    del self.jobs[job.id]
+
+    def close(self):
+        self.pool.terminate()
+        self.pool.join()
+
+
+class ServiceHandler(BaseHTTPRequestHandler):
+
+    def do_POST(self):
+        if self.path.rstrip('/') != '/jobs':
+            return self.reply(404, {'error': "Unknown path '{0}'".format(self.path)})
+        try:
+            length = int(self.headers.getheader('content-length', 0))
+            job = self.server.service.submit(json.loads(self.rfile.read(length)))
+        except ValueError as e:
+            return self.reply(400, {'error': str(e)})
+        except RuntimeError as e:
+            return self.reply(503, {'error': str(e)})
+        except Exception as e:
+            # malformed submissions the checks above missed still get an answer
+            return self.reply(400, {'error': "{0}: {1}".format(type(e).__name__, e)})
+        self.reply(200 if job.status == 'done' else 202, job.describe())
+
+    def do_GET(self):
+        parts = self.path.strip('/').split('/')
+        job = self.server.service.jobs.get(parts[1]) if len(parts) in (2, 3) and parts[0] == 'jobs' else None
+        if job is None or (len(parts) == 3 and parts[2] != 'events'):
+            return self.reply(404, {'error': "Unknown path '{0}'".format(self.path)})
+        if len(parts) == 2:
+            return self.reply(200, job.describe())
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/x-ndjson')
+        self.end_headers()
+        # one line per progress change, the last one carries the result.
+        # The socket is written without holding the lock, a slow client
+        # must not block Job.update; it skips versions it was too slow for.
+        sent = None
+        while True:
+            with job.changed:
+                while job.version == sent:
+                    job.changed.wait()
+                sent = job.version
+                snapshot = job.describe()
+            self.wfile.write(json.dumps(snapshot) + '\n')
+            self.wfile.flush()
+            if snapshot['status'] in ('done', 'failed'):
+                break
+
+    def reply(self, code, body):
+        content = json.dumps(body)
+        self.send_response(code)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class ServiceServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, service):
+        HTTPServer.__init__(self, address, ServiceHandler)
+        self.service = service
+
+
+class ServiceClient(object):
+    """Submits instances to a running service and follows their jobs"""
+
+    def __init__(self, url="http://{0}:{1}".format(HOST, PORT)):
+        self.url = url.rstrip('/')
+
+    def request(self, path, body=None):
+        data = json.dumps(body) if body is not None else None
+        request = urllib2.Request(self.url + path, data, {'Content-Type': 'application/json'})
+        try:
+            return json.load(urllib2.urlopen(request))
+        except urllib2.HTTPError as e:
+            raise RuntimeError("{0}: {1}".format(e.code, json.load(e).get('error')))
+
+    def submit(self, tsplib=None, coords=None, parameters=None, time_limit=None, **fields):
+        """job description of a new or cached job, fields go into the submission (name, edge_weight_type)"""
+        submission = dict(fields, parameters=parameters or {})
+        if tsplib is not None:
+            submission['tsplib'] = tsplib
+        if coords is not None:
+            submission['coords'] = numpy.asarray(coords).tolist()
+        if time_limit is not None:
+            submission['time_limit'] = time_limit
+        return self.request('/jobs', submission)
+
+    def status(self, job_id):
+        return self.request('/jobs/' + job_id)
+
+    def events(self, job_id):
+        """job descriptions as the job progresses, the last one is final"""
+        response = urllib2.urlopen(self.url + '/jobs/{0}/events'.format(job_id))
+        for line in iter(response.readline, ''):
+            yield json.loads(line)
+
+    def solve(self, tsplib=None, coords=None, parameters=None, time_limit=None, **fields):
+        """submit and wait, returns the final job description"""
+        job = self.submit(tsplib, coords, parameters, time_limit, **fields)
+        for job in self.events(job['id']):
+            pass
+        return job
+
+
+def selftest(workers=1):
+    """run ServiceClient against a service on a free local port, True if all checks pass"""
+    service = SolverService(workers)
+    server = ServiceServer((HOST, 0), service)
+    thread = threading.Thread(target=server.serve_forever, name='selftest-server')
+    thread.daemon = True
+    thread.start()
+    client = ServiceClient("http://{0}:{1}".format(*server.server_address))
+    coords = numpy.random.RandomState(0).rand(60, 2) * 1000
+    parameters = {'iteration_limit': 20, 'seed': 1}
+    checks = []
+
+    def check(name, passed):
+        checks.append(passed)
+        print "{0:<40} {1}".format(name, 'ok' if passed else 'FAILED')
+
+    try:
+        job = client.solve(coords=coords, parameters=parameters, name='selftest')
+        check("solved", job['status'] == 'done' and sorted(job['result']['tour']) == range(len(coords)))
+        check("status", client.status(job['id'])['result'] == job['result'])
+        again = client.submit(coords=coords, parameters=parameters)
+        check("cached", again['cached'] and again['result'] == job['result'])
+        failed = client.solve(coords=coords, parameters={'starter': 'unknown'})
+        check("failure reported", failed['status'] == 'failed' and bool(failed['error']))
+        for submission in ({'coords': [[0, 0]]}, {'coords': coords, 'parameters': {'unknown': 1}}):
+            try:
+                client.submit(**submission)
+                check("refused", False)
+            except RuntimeError as e:
+                check("refused ({0})".format(e), str(e).startswith('400'))
+    finally:
+        server.shutdown()
+        server.server_close()
+        service.close()
+    return all(checks)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Local TSP solver service")
+    parser.add_argument('--host', default=HOST)
+    parser.add_argument('--port', type=int, default=PORT)
+    parser.add_argument('-w', '--workers', type=int, default=1, help="solver processes")
+    parser.add_argument('--queue-size', type=int, default=QUEUE_SIZE, help="jobs waiting at most")
+    parser.add_argument('--selftest', action='store_true', help="check the service and ServiceClient on a free port, then exit")
+    args = parser.parse_args(argv)
+    if args.selftest:
+        return 0 if selftest(args.workers) else 1
+
+    service = SolverService(args.workers, args.queue_size)
+    server = ServiceServer((args.host, args.port), service)
+    print "serving on http://{0}:{1}".format(args.host, args.port)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        service.close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,879 @@
+# -*- coding: utf-8 -*-
+
+import os
+import random
+import itertools
+from collections import OrderedDict
+import numpy
+from datetime import datetime, timedelta
+from timeit import default_timer
+
+from tsp_cache import InstanceCache
+from tsp_construct import STARTER_NEIGHBORS, construct_tour
+from tsp_acceptance import ACCEPTANCE_RULES, KICKS, KICK_MAX, Acceptance, KickStrength
+from tsp_history import ROW_DTYPE, SolutionHistory, tour_dtype
+from tsp_hashing import CACHE_SIZE, LRUCache, TourHash
+from tsp_checkpoint import append_rows, pack_random_state, read_rows, restore_random_state, save_checkpoint
+from tsp_profile import Profiler, profiled, profiling_requested
+from tsp_distance import NUMPY_PRECISION, distance_oracle, resolve_mode, tour_length
+from tsp_neighbors import build_neighbor_lists, matrix_neighbors
+from tsp_parallel import merge_improvements, run_parallel
+from tsp_decompose import DECOMPOSE_ROUNDS, DECOMPOSE_ITERATIONS, decompose
+from tsp_localsearch import CandidateSearch, EPSILON, STOP_CHECK_INTERVAL
+from tsp_parser import read_tsplib
+from tsp_runstore import RunStore, solver_run
+from tsp_tour import ArrayTour, make_tour
+
+numpy.set_printoptions(precision=NUMPY_PRECISION)
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+# minimum seconds between two progress reports
+PROGRESS_INTERVAL = 0.1
+
+
+class Solver(object):
+    """Iterated local search for one TSPLIB instance, without any GUI dependency.
+    Progress is reported through the optional progress callback, which is
+    called with the iteration count and the current solution.
+    instance (meta, coordinates, weights) solves in-memory data instead of
+    file_path, without cache and log (used for sub-problems)."""
+
+    def __init__(self, file_path, use_cache=True, progress=None, instance=None):
+        self.progress = progress
+        self.meta = OrderedDict()
+        self.data = None
+        self.weights = None
+        self.dimension = 0
+        self.metric = 'EUC_2D'
+        self.iteration_limit = 200
+        self.alternative = False
+        self.idle_limit = 50
+        self.neighbor_k = 0
+        self.neighbor_index = 'grid'
+        self.distance_mode = 'auto'
+        self.workers = 1
+        self.seed = None
+        self.time_limit = None
+        self.tour_type = 'auto'
+        self.local_search_mode = '2opt'
+        self.starter = 'random'
+        self.alt_batch = 1
+        self.alt_pick = 'best'
+        self.cache_size = CACHE_SIZE
+        # per-iteration trace file and cProfile dump of solve()
+        self.trace = False
+        self.profile = profiling_requested()
+        self.stall_seconds = None
+        self.stall_iterations = None
+        # seconds between two checkpoints, None = no checkpoints
+        self.checkpoint_interval = None
+        self.checkpoint_path = None
+        # tour windows solved as sub-problems, see tsp_decompose
+        self.decompose_window = 0
+        self.decompose_rounds = DECOMPOSE_ROUNDS
+        self.decompose_iterations = DECOMPOSE_ITERATIONS
+        # see tsp_acceptance
+        self.acceptance_rule = 'better'
+        self.kick = 'random'
+        self.kick_neighbors = None
+        # benchmarks and workers do not store their runs
+        self.write_log = True
+
+        self.dist_matrix = None
+        self.neighbors = None
+        self.neighbor_lists = None
+        self.iterations = 0
+        self.runtime = ""
+        self.history = SolutionHistory()
+        self.best_solution = {}
+        self.worker_stats = []
+        self.moves_evaluated = 0
+        self.moves_applied = 0
+        # (seconds, iteration, distance) whenever the best solution improves
+        self.improvements = []
+        # time and tour length of the start tour before the first local search
+        self.starter_runtime = None
+        self.starter_distance = None
+        # Zobrist keys of tours, start states -> (optimum key, distance) and seen local optima
+        self.hasher = None
+        self.starts = LRUCache(self.cache_size)
+        self.optima = LRUCache(self.cache_size)
+        # history rows and improving tours already appended next to the checkpoint
+        self.checkpointed = (0, 0)
+        self.acceptance = Acceptance()
+        self.kick_strength = KickStrength()
+        self.profiler = Profiler()
+        # cooperative cancellation, stop_event is shared with worker processes
+        self.cancelled = False
+        self.stop_event = None
+        self.deadline = None
+        self.stop_reason = None
+        self.last_progress = None
+        # called after every iteration, may replace the current solution
+        self.exchange = None
+
+        # fixed start tour instead of the starter
+        self.initial = None
+
+        self.file_path = file_path
+        if instance is not None:
+            self.cache = None
+            self.set_instance(*instance)
+            self.write_log = False
+            return
+        self.cache = InstanceCache(file_path) if use_cache else None
+        self.load(file_path)
+
+    def reset(self):
+        self.iterations = 0
+        self.runtime = ""
+        self.history = SolutionHistory()
+        self.best_solution = {}
+        self.worker_stats = []
+        self.moves_evaluated = 0
+        self.moves_applied = 0
+        self.improvements = []
+        self.starter_runtime = None
+        self.starter_distance = None
+        self.checkpointed = (0, 0)
+        self.reset_search_state()
+        self.profiler.close()
+        self.profiler = Profiler(self.output_path('trace', '.csv') if self.trace else None)
+        self.cancelled = False
+        self.stop_event = None
+        self.deadline = None
+        self.stop_reason = None
+        self.last_progress = None
+
+    def load(self, file_path):
+        self.set_instance(*self.read_instance(file_path))
+
+    def set_instance(self, meta, data, weights):
+        self.meta, self.data, self.weights = meta, data, weights
+        self.dimension = int(self.meta['dimension'])
+        self.metric = self.meta.get('edge_weight_type', 'euc_2d').upper()
+
+    def read_instance(self, file_path):
+        if self.cache is not None:
+            meta = self.cache.load_meta()
+            if meta is not None:
+                meta = OrderedDict(meta)
+                data = self.cache.load('coords')
+                weights = self.cache.load('weights')
+                if (data is not None) == meta['has_coords'] and (weights is not None) == meta['has_weights']:
+                    del meta['has_coords'], meta['has_weights']
+                    return meta, data, weights
+
+        meta, data, weights = read_tsplib(file_path)
+
+        if self.cache is not None:
+            if data is not None:
+                self.cache.save('coords', data)
+            if weights is not None:
+                self.cache.save('weights', weights)
+            self.cache.save_meta(meta.items() + [('has_coords', data is not None),
+                                                 ('has_weights', weights is not None)])
+        return meta, data, weights
+
+    def cached(self, name, compute):
+        if self.cache is None:
+            return compute()
+        return self.cache.cached(name, compute)
+
+    def setParameters(self, iteration_limit, alternative, idle_limit, neighbor_k=0, neighbor_index='grid',
+                      distance_mode='auto', workers=1, seed=None, time_limit=None, tour_type='auto',
+                      local_search_mode='2opt', starter='random', alt_batch=1, alt_pick='best',
+                      cache_size=CACHE_SIZE, trace=False, profile=None, stall_seconds=None,
+                      stall_iterations=None, checkpoint_interval=None, checkpoint_path=None,
+                      decompose_window=0, decompose_rounds=DECOMPOSE_ROUNDS,
+                      decompose_iterations=DECOMPOSE_ITERATIONS, acceptance='better', kick='random'):
+        """neighbor_k > 0 restricts 2-opt to moves joining a city to one of its
+        neighbor_k nearest neighbors, found with the given spatial index.
+        distance_mode picks the distance backend, see tsp_distance.distance_oracle.
+        workers > 1 runs that many ILS trajectories in parallel processes,
+        seeded with seed, seed + 1, ...
+        time_limit (seconds) stops the search early once it is exceeded.
+        tour_type picks the tour structure of the local search, see tsp_tour.make_tour.
+        local_search_mode '2opt' or 'oropt' (2-opt, Or-opt and segment insertion),
+        see tsp_localsearch.CandidateSearch.
+        starter builds the initial tour, see tsp_construct.construct_tour.
+        alt_batch > 1 scores that many random moves of the alternative search
+        at once with numpy and applies the 'best' or 'first' improving one (alt_pick),
+        the idle limit then counts batches.
+        cache_size bounds the caches of start states and local optima (0 = off),
+        see Solver.search_from.
+        trace writes a line per iteration to log/trace/, profile dumps cProfile
+        stats of solve() to log/profile/ (default: environment variable TSP_PROFILE).
+        The search stops at whichever comes first: iteration_limit (0 or None for
+        no limit), time_limit, stall_seconds or stall_iterations without an
+        improvement, or cancel().
+        checkpoint_interval (seconds) saves the search state to checkpoint_path,
+        default log/checkpoint/<name>.npz, see Solver.resume.
+        decompose_window > 0 optimizes windows of that many cities of the tour
+        as sub-problems in decompose_rounds rounds with decompose_iterations ILS
+        iterations each, on workers processes, see tsp_decompose.
+        acceptance picks the rule for moving to a new local optimum and kick
+        'local' confines double bridges to a neighborhood of adaptive size
+        instead of the whole tour, see tsp_acceptance."""
+        if acceptance not in ACCEPTANCE_RULES:
+            raise ValueError("Unknown acceptance rule '{0}', use one of {1}".format(acceptance, ACCEPTANCE_RULES))
+        if kick not in KICKS:
+            raise ValueError("Unknown kick '{0}', use one of {1}".format(kick, KICKS))
+        self.acceptance_rule = acceptance
+        self.kick = kick
+        self.decompose_window = decompose_window
+        self.decompose_rounds = decompose_rounds
+        self.decompose_iterations = decompose_iterations
+        self.checkpoint_interval = checkpoint_interval
+        self.checkpoint_path = checkpoint_path
+        self.stall_seconds = stall_seconds
+        self.stall_iterations = stall_iterations
+        self.trace = trace
+        self.profile = profiling_requested() if profile is None else profile
+        self.cache_size = cache_size
+        self.alt_batch = alt_batch
+        self.alt_pick = alt_pick
+        self.starter = starter
+        self.local_search_mode = local_search_mode
+        self.tour_type = tour_type
+        self.time_limit = time_limit
+        self.workers = workers
+        self.seed = seed
+        self.iteration_limit = iteration_limit
+        self.idle_limit = idle_limit
+        self.alternative = alternative
+        if (neighbor_k, neighbor_index) != (self.neighbor_k, self.neighbor_index):
+            self.neighbors = None
+            self.kick_neighbors = None
+            self.dist_matrix = None
+        if distance_mode != self.distance_mode:
+            self.dist_matrix = None
+        self.neighbor_k = neighbor_k
+        self.neighbor_index = neighbor_index
+        self.distance_mode = distance_mode
+        self.reset_search_state()
+
+    def reset_search_state(self):
+        """hash caches, acceptance rule and kick strength as the parameters ask"""
+        self.starts = LRUCache(self.cache_size)
+        self.optima = LRUCache(self.cache_size)
+        self.acceptance = Acceptance(self.acceptance_rule, self.dimension)
+        self.kick_strength = KickStrength()
+
+    def parameters(self):
+        """keyword arguments of setParameters reproducing the current setup"""
+        return {'iteration_limit': self.iteration_limit,
+                'alternative': self.alternative,
+                'idle_limit': self.idle_limit,
+                'neighbor_k': self.neighbor_k,
+                'neighbor_index': self.neighbor_index,
+                'distance_mode': self.distance_mode,
+                'workers': self.workers,
+                'seed': self.seed,
+                'time_limit': self.time_limit,
+                'tour_type': self.tour_type,
+                'local_search_mode': self.local_search_mode,
+                'starter': self.starter,
+                'alt_batch': self.alt_batch,
+                'alt_pick': self.alt_pick,
+                'cache_size': self.cache_size,
+                'trace': self.trace,
+                'profile': self.profile,
+                'stall_seconds': self.stall_seconds,
+                'stall_iterations': self.stall_iterations,
+                'checkpoint_interval': self.checkpoint_interval,
+                'checkpoint_path': self.checkpoint_path,
+                'decompose_window': self.decompose_window,
+                'decompose_rounds': self.decompose_rounds,
+                'decompose_iterations': self.decompose_iterations,
+                'acceptance': self.acceptance_rule,
+                'kick': self.kick}
+
+    def output_path(self, kind, extension):
+        """log/<kind>/<name>_<timestamp><extension>"""
+        return os.path.join(ROOT_DIR, 'log', kind, "{0}_{1}{2}".format(
+            self.meta['name'], datetime.now().strftime('%Y%m%d-%H%M%S-%f'), extension))
+
+    def calc_dist_matrix(self):
+        if self.weights is not None:
+            return self.weights
+        compute = lambda: distance_oracle(self.data, self.neighbors, self.distance_mode, self.metric)
+        if resolve_mode(self.dimension, self.neighbors, self.distance_mode) == 'dense':
+            return self.cached('dist', compute)
+        return compute()
+
+    def calc_neighbors(self, k=None):
+        k = k or self.neighbor_k
+        if self.weights is not None:
+            return matrix_neighbors(self.weights, k)
+        return build_neighbor_lists(self.data, k, self.neighbor_index)
+
+    def starter_neighbors(self):
+        """candidate lists for the starters, the local search lists if there are any"""
+        if self.starter not in ('nearest', 'greedy', 'mst'):
+            return None
+        if self.neighbors is not None:
+            return self.neighbors
+        return self.cached('neighbors_{0}_{1}'.format(self.neighbor_index, STARTER_NEIGHBORS),
+                           lambda: self.calc_neighbors(STARTER_NEIGHBORS))
+
+    def initial_tour(self):
+        started = datetime.now()
+        with self.profiler.phase('construction'):
+            if self.initial is not None:
+                tour = list(self.initial)
+            else:
+                tour = construct_tour(self.starter, self.dimension, self.dist_matrix, self.data,
+                                      self.starter_neighbors())
+        self.starter_runtime = datetime.now() - started
+        self.starter_distance = self.calculate_tour_distance(tour)
+        return tour
+
+    def prepare(self):
+        if self.neighbor_k and self.neighbors is None:
+            self.neighbors = self.cached(
+                'neighbors_{0}_{1}'.format(self.neighbor_index, self.neighbor_k), self.calc_neighbors)
+        if self.neighbors is not None:
+            # python lists are much faster to iterate in the local search
+            self.neighbor_lists = self.neighbors.tolist()
+        if self.dist_matrix is None:
+            with self.profiler.phase('distance'):
+                self.dist_matrix = self.calc_dist_matrix()
+        if self.hasher is None:
+            self.hasher = TourHash(self.dimension)
+        if self.kick == 'local' and self.kick_neighbors is None:
+            self.kick_neighbors = self.cached('neighbors_{0}_{1}'.format(self.neighbor_index, KICK_MAX),
+                                              lambda: self.calc_neighbors(KICK_MAX)).tolist()
+
+    def solve(self, resume=None):
+        with profiled(self.output_path('profile', '.prof') if self.profile else None):
+            return self.run_solver(resume)
+
+    def resume(self, checkpoint):
+        """Continue the run saved in a checkpoint, loaded with
+        tsp_checkpoint.load_checkpoint. With a seed the resumed run takes
+        exactly the same steps as an uninterrupted one."""
+        arrays, info = checkpoint
+        self.setParameters(**info['parameters'])
+        return self.solve(resume=checkpoint)
+
+    def run_solver(self, resume=None):
+        self.prepare()
+        self.reset()
+
+        start = datetime.now()
+        if resume is not None:
+            start -= timedelta(seconds=resume[1]['elapsed'])
+        if self.time_limit is not None:
+            self.deadline = default_timer() + self.time_limit - (datetime.now() - start).total_seconds()
+        if resume is not None:
+            self.best_solution = self.iterated_local_search(self.iteration_limit, self.idle_limit, start, resume)
+        elif self.decompose_window:
+            if self.seed is not None:
+                random.seed(self.seed)
+                numpy.random.seed(self.seed)
+            self.best_solution = decompose(self, start)
+        elif self.workers > 1:
+            self.best_solution, self.worker_stats = run_parallel(self, self.workers, self.seed)
+            self.history.record(self.best_solution, self.best_solution['runtime'].total_seconds(), True, True)
+            self.merge_worker_stats()
+            self.stop_reason = 'cancelled' if self.cancelled else self.worker_stats[0]['stop-reason']
+        else:
+            if self.seed is not None:
+                random.seed(self.seed)
+                numpy.random.seed(self.seed)
+            self.best_solution = self.iterated_local_search(self.iteration_limit, self.idle_limit, start)
+        self.runtime = datetime.now() - start
+
+        if self.write_log:
+            with self.profiler.phase('logging'):
+                self.log_run(start)
+        self.profiler.close()
+        return self.best_solution
+
+    def merge_worker_stats(self):
+        """counters, improvements and phase times of a parallel run from its
+        workers, the start tour is the one of the best worker"""
+        stats = self.worker_stats
+        best = min(stats, key=lambda s: s['distance'])
+        self.starter_runtime = best['starter-runtime']
+        self.starter_distance = best['starter-distance']
+        self.iterations = sum(s['iterations'] for s in stats)
+        self.moves_evaluated = sum(s['moves-evaluated'] for s in stats)
+        self.moves_applied = sum(s['moves-applied'] for s in stats)
+        self.improvements = merge_improvements(stats)
+        # process seconds, workers run side by side
+        for name in self.profiler.seconds:
+            self.profiler.seconds[name] += sum(s['phase-seconds'][name] for s in stats)
+        counts = numpy.array([s['cache-counts'] for s in stats]).sum(axis=0).tolist()
+        self.starts.hits, self.starts.misses, self.optima.hits, self.optima.misses = counts
+
+    def log_run(self, start):
+        self.img = self.figure_path()
+        self.store_run(start)
+
+    def figure_path(self):
+        alt_suffix = '' if not self.alternative else 'alt_'
+        return os.path.join(ROOT_DIR, 'log', 'figures', "{0}_{1}{2}_{3}.png".format(
+                self.meta['name'],
+                alt_suffix,
+                str(self.best_solution['distance']),
+                str(self.best_solution['iteration'] + 1)))
+
+    def store_run(self, start):
+        """save the finished run, started at start, to the run store"""
+        RunStore().save(*solver_run(self, start))
+
+    def iterated_local_search(self, iteration_limit, idle_limit, start_timestamp, resume=None):
+        """Source: Algorithm3 from http://www.scielo.br/scielo.php?script=sci_arttext&pid=S2238-10312014000400010
+        resume continues from a checkpoint instead of a new initial tour.
+        The search kicks the current solution, which self.acceptance may let
+        differ from the best one, solution."""
+        if self.time_limit is not None:
+            elapsed = (datetime.now() - start_timestamp).total_seconds()
+            self.deadline = default_timer() + self.time_limit - elapsed
+        if resume is not None:
+            solution, current, first, last_improvement = self.restore_checkpoint(resume)
+        else:
+            solution = {'tour': [], 'distance': 0, 'iteration': 0}
+            solution['tour'] = self.initial_tour()
+            solution['distance'] = self.starter_distance
+
+            with self.profiler.phase('local_search'):
+                solution = self.local_search_wrapper(solution)
+            solution['iteration'] = 1
+            solution['runtime'] = datetime.now() - start_timestamp
+            self.improvements.append((solution['runtime'].total_seconds(), 1, solution['distance']))
+            self.history.record(solution, solution['runtime'].total_seconds(), True, True)
+            self.iterations += 1
+            first = 1
+            last_improvement = (1, default_timer())
+            current = solution
+
+        last_checkpoint = default_timer()
+        for i in (xrange(first, iteration_limit) if iteration_limit else itertools.count(first)):
+            self.report_progress(solution)
+            if self.checkpoint_interval is not None and self.exchange is None and \
+                    default_timer() - last_checkpoint >= self.checkpoint_interval:
+                self.write_checkpoint(i, solution, current, last_improvement, start_timestamp)
+                last_checkpoint = default_timer()
+            if self.should_stop() or self.stagnated(i, last_improvement):
+                break
+            with self.profiler.phase('perturbation'):
+                start = self.perturbation(current)
+            new_solution = self.search_from(start, current['distance'])
+            seconds = (datetime.now() - start_timestamp).total_seconds()
+            if self.kick == 'local':
+                self.kick_strength.record(new_solution['distance'] < current['distance'])
+            # skipped searches (no tour) are never accepted, see search_from
+            accepted = self.acceptance.accept(new_solution['distance'], current['distance']) and \
+                new_solution['tour'] is not None
+            improved = new_solution['distance'] < solution['distance']
+            if accepted:
+                current = new_solution
+                current['iteration'] = i + 1
+                current['runtime'] = datetime.now() - start_timestamp
+            if improved:
+                solution = new_solution
+                self.improvements.append((seconds, i + 1, solution['distance']))
+                last_improvement = (i + 1, default_timer())
+            self.history.record(new_solution, seconds, accepted, improved)
+            self.profiler.iteration(self, i + 1, new_solution, current, accepted)
+            self.iterations += 1
+            if self.acceptance.restart():
+                current = self.restart_solution(i + 1, start_timestamp)
+            if self.exchange is not None:
+                exchanged = self.exchange(i + 1, solution)
+                if exchanged is not solution:
+                    solution = current = exchanged
+        else:
+            self.stop_reason = 'iterations'
+        self.report_progress(solution, force=True)
+        return solution
+
+    def restart_solution(self, iteration, start_timestamp):
+        """local optimum of a random tour, the new current solution of the restart rule"""
+        with self.profiler.phase('construction'):
+            tour = construct_tour('random', self.dimension, self.dist_matrix, self.data)
+        solution = {'tour': tour, 'distance': self.calculate_tour_distance(tour)}
+        with self.profiler.phase('local_search'):
+            solution = self.local_search_wrapper(solution)
+        solution['iteration'] = iteration
+        solution['runtime'] = datetime.now() - start_timestamp
+        return solution
+
+    def checkpoint_file(self):
+        return self.checkpoint_path or os.path.join(ROOT_DIR, 'log', 'checkpoint', self.meta['name'] + '.npz')
+
+    def write_checkpoint(self, iteration, solution, current, last_improvement, start_timestamp):
+        """Save everything the loop needs to continue at iteration. Parallel
+        workers (exchange set) do not write checkpoints. History rows and
+        improving tours since the previous checkpoint are appended to the
+        .history and .tours files next to it, see tsp_checkpoint."""
+        path = self.checkpoint_file()
+        starts = self.starts.items()
+        optima = self.optima.items()
+        arrays = {'tour': numpy.array(solution['tour'], dtype=numpy.int32),
+                  'current_tour': numpy.array(current['tour'], dtype=numpy.int32),
+                  'improvements': numpy.array(self.improvements, dtype=numpy.float64).reshape(-1, 3),
+                  # searches are skipped on cache hits, resuming needs the same entries
+                  'starts_keys': numpy.array([key for key, _ in starts], dtype=numpy.uint64),
+                  'starts_optima': numpy.array([value[0] for _, value in starts], dtype=numpy.uint64),
+                  'starts_distances': numpy.array([value[1] for _, value in starts], dtype=numpy.int64),
+                  'optima_keys': numpy.array([key for key, _ in optima], dtype=numpy.uint64),
+                  'optima_distances': numpy.array([value for _, value in optima], dtype=numpy.int64)}
+        arrays.update(pack_random_state())
+        arrays.update(self.history.state())
+        info = {'file_path': os.path.abspath(self.file_path),
+                'parameters': self.parameters(),
+                'iteration': iteration,
+                'iterations': self.iterations,
+                'distance': solution['distance'],
+                'solution_iteration': solution['iteration'],
+                'solution_runtime': solution['runtime'].total_seconds(),
+                'current_distance': current['distance'],
+                'current_iteration': current['iteration'],
+                'current_runtime': current['runtime'].total_seconds(),
+                'acceptance': self.acceptance.state(),
+                'kick_strength': self.kick_strength.state(),
+                'last_improvement': last_improvement[0],
+                'stalled_seconds': default_timer() - last_improvement[1],
+                'elapsed': (datetime.now() - start_timestamp).total_seconds(),
+                'moves_evaluated': self.moves_evaluated,
+                'moves_applied': self.moves_applied,
+                'starter_runtime': self.starter_runtime.total_seconds(),
+                'starter_distance': self.starter_distance,
+                'cache_counts': [self.starts.hits, self.starts.misses, self.optima.hits, self.optima.misses]}
+        with self.profiler.phase('logging'):
+            rows, tours = self.checkpointed
+            directory = os.path.dirname(path)
+            if directory and not os.path.isdir(directory):
+                os.makedirs(directory)
+            append_rows(path + '.history', self.history.rows(rows), rows)
+            appended = self.history.improving_tours(self.dimension, rows)
+            append_rows(path + '.tours', appended, tours)
+            self.checkpointed = (len(self.history), tours + len(appended))
+            info['history_rows'], info['history_tours'] = self.checkpointed
+            save_checkpoint(path, arrays, info)
+
+    def restore_checkpoint(self, checkpoint):
+        """counterpart of write_checkpoint, returns (solution, current, iteration, last_improvement)"""
+        arrays, info = checkpoint
+        path = info['path']
+        restore_random_state(arrays)
+        self.history.restore(arrays,
+                             read_rows(path + '.history', ROW_DTYPE, info['history_rows']),
+                             read_rows(path + '.tours', tour_dtype(self.dimension), info['history_tours']))
+        # later checkpoints append to these files only if they go to the same place
+        if os.path.abspath(path) == os.path.abspath(self.checkpoint_file()):
+            self.checkpointed = (info['history_rows'], info['history_tours'])
+        self.improvements = [(seconds, int(iteration), int(distance))
+                             for seconds, iteration, distance in arrays['improvements'].tolist()]
+        starts_hits, starts_misses, optima_hits, optima_misses = info['cache_counts']
+        self.starts.restore(zip(arrays['starts_keys'].tolist(),
+                                zip(arrays['starts_optima'].tolist(), arrays['starts_distances'].tolist())),
+                            starts_hits, starts_misses)
+        self.optima.restore(zip(arrays['optima_keys'].tolist(), arrays['optima_distances'].tolist()),
+                            optima_hits, optima_misses)
+        self.iterations = info['iterations']
+        self.moves_evaluated = info['moves_evaluated']
+        self.moves_applied = info['moves_applied']
+        self.starter_runtime = timedelta(seconds=info['starter_runtime'])
+        self.starter_distance = info['starter_distance']
+        solution = {'tour': arrays['tour'].tolist(),
+                    'distance': info['distance'],
+                    'iteration': info['solution_iteration'],
+                    'runtime': timedelta(seconds=info['solution_runtime'])}
+        current = {'tour': arrays['current_tour'].tolist(),
+                   'distance': info['current_distance'],
+                   'iteration': info['current_iteration'],
+                   'runtime': timedelta(seconds=info['current_runtime'])}
+        self.acceptance.restore(info['acceptance'])
+        self.kick_strength.restore(info['kick_strength'])
+        last_improvement = (info['last_improvement'], default_timer() - info['stalled_seconds'])
+        return solution, current, info['iteration'], last_improvement
+
+    def cancel(self):
+        """Ask a running search to stop, it returns the best solution so far.
+        Safe to call from another thread."""
+        self.cancelled = True
+        if self.stop_event is not None:
+            self.stop_event.set()
+
+    def should_stop(self):
+        """cooperative stop check, also polled inside the local searches"""
+        if self.stop_reason is not None:
+            return True
+        if self.cancelled or (self.stop_event is not None and self.stop_event.is_set()):
+            self.stop_reason = 'cancelled'
+        elif self.deadline is not None and default_timer() >= self.deadline:
+            self.stop_reason = 'time'
+        return self.stop_reason is not None
+
+    def stagnated(self, iteration, last_improvement):
+        """no improvement for stall_iterations iterations or stall_seconds seconds"""
+        improved_at, improved_time = last_improvement
+        if self.stall_iterations is not None and iteration - improved_at >= self.stall_iterations:
+            self.stop_reason = 'stall-iterations'
+        elif self.stall_seconds is not None and default_timer() - improved_time >= self.stall_seconds:
+            self.stop_reason = 'stall-seconds'
+        return self.stop_reason is not None
+
+    def report_progress(self, solution, force=False):
+        """progress callback, at most once per PROGRESS_INTERVAL seconds"""
+        if self.progress is None:
+            return
+        now = default_timer()
+        if force or self.last_progress is None or now - self.last_progress >= PROGRESS_INTERVAL:
+            self.last_progress = now
+            self.progress(self.iterations, solution, self.profiler.snapshot(self))
+
+    def search_from(self, start, current_distance):
+        """Local search from a perturbed start state, short-circuited by the
+        caches when the search is deterministic (not the alternative search)
+        and a known optimum could not be accepted (not annealing): a start
+        state already searched whose optimum was no better than the
+        current solution (longer under 'better-equal', which accepts equal
+        ones) is not searched again, the returned solution then has no
+        tour. Returns the local optimum and counts revisited optima."""
+        if not self.cache_size:
+            with self.profiler.phase('local_search'):
+                return self.local_search_wrapper(start)
+        start_key = self.tour_key(start)
+        if not self.alternative and self.acceptance_rule != 'annealing':
+            known = self.starts.get(start_key)
+            rejected = known is not None and (known[1] > current_distance or (
+                known[1] == current_distance and self.acceptance_rule != 'better-equal'))
+            if rejected:
+                self.optima.get(known[0])
+                return {'tour': None, 'distance': known[1], 'key': known[0]}
+        with self.profiler.phase('local_search'):
+            optimum = self.local_search_wrapper(start)
+        if self.stop_reason is not None:
+            # interrupted searches did not reach a local optimum
+            return optimum
+        optimum_key = self.tour_key(optimum)
+        if self.optima.get(optimum_key) is None:
+            self.optima.put(optimum_key, optimum['distance'])
+        self.starts.put(start_key, (optimum_key, optimum['distance']))
+        return optimum
+
+    def tour_key(self, solution):
+        """Zobrist key of the solution's tour, computed once and then kept up to
+        date by the perturbation and the candidate local search"""
+        key = solution.get('key')
+        if key is None:
+            key = solution['key'] = self.hasher.tour(solution['tour'])
+        return key
+
+    def calculate_tour_distance(self, tour):
+        with self.profiler.phase('distance'):
+            return tour_length(self.dist_matrix, tour)
+
+    def local_search_wrapper(self, solution):
+        """this wrapper is used to change local search mode.
+        Solutions coming from a perturbation name the cities it touched,
+        the 2-opt then only starts from those."""
+        touched = solution.pop('touched', None)
+        if self.alternative or (not self.neighbor_k and touched is None and self.local_search_mode == '2opt'):
+            # these searches do not track the key
+            solution.pop('key', None)
+        if self.alternative and self.alt_batch > 1:
+            return self.local_search_alt_batch(solution, self.idle_limit)
+        elif self.alternative:
+            return self.local_search_alt(solution, self.idle_limit)
+        elif self.neighbor_k or touched is not None or self.local_search_mode != '2opt':
+            return self.local_search_candidates(solution, touched)
+        else:
+            return self.local_search(solution)
+
+    def local_search(self, solution):
+        """First-improvement 2-opt until no improving move is left.
+        Every move is scored by its edge-exchange gain, the tour is only
+        touched once a move is accepted and the distance is kept incrementally."""
+        tour = solution['tour']
+        distance = solution['distance']
+        dist = self.dist_matrix
+        n = len(tour)
+        improved = True
+        while improved:
+            improved = False
+            for i in range(0, n - 2):
+                if self.should_stop():
+                    improved = False
+                    break
+                a, b = tour[i], tour[i + 1]
+                d_ab = dist[a, b]
+                # (0, n-1) would remove two adjacent edges
+                end = n if i > 0 else n - 1
+                self.moves_evaluated += end - i - 2
+                for j in range(i + 2, end):
+                    c, d = tour[j], tour[(j + 1) % n]
+                    gain = d_ab + dist[c, d] - dist[a, c] - dist[b, d]
+                    if gain > EPSILON:
+                        self.reverse_segment(tour, i + 1, j)
+                        distance -= gain
+                        self.moves_applied += 1
+                        improved = True
+                        a, b = tour[i], tour[i + 1]
+                        d_ab = dist[a, b]
+        solution['tour'] = tour
+        solution['distance'] = distance
+        return solution
+
+    def local_search_candidates(self, solution, active=None):
+        """Don't-look-bit local search over the candidate lists, see
+        tsp_localsearch.CandidateSearch. Without neighbor lists every city is
+        a candidate. active names the cities to start from, default all."""
+        tour = self.make_tour(solution['tour'])
+        candidates = self.neighbor_lists if self.neighbor_k else None
+        tracked = 'key' in solution
+        search = CandidateSearch(tour, self.dist_matrix, candidates, self.local_search_mode,
+                                 self.hasher if tracked else None, self.should_stop)
+        gain = search.run(solution['tour'] if active is None else active)
+        self.moves_evaluated += search.evaluated
+        self.moves_applied += search.applied
+        solution['tour'] = tour.to_list()
+        if tracked:
+            solution['key'] ^= search.key
+        solution['distance'] -= gain
+        return solution
+
+    def local_search_alt(self, solution, idle_limit):
+        """Random 2-opt moves scored by their gain, stops after idle_limit
+        moves in a row did not improve the tour"""
+        tour = self.make_tour(solution['tour'])
+        distance = solution['distance']
+        dist = self.dist_matrix
+        n = len(tour)
+        idle_counter = 0
+        total_counter = 0
+
+        while idle_counter < idle_limit:
+            if total_counter % STOP_CHECK_INTERVAL == 0 and self.should_stop():
+                break
+            a = random.randrange(n)
+            c = random.randrange(n)
+            b, d = tour.next(a), tour.next(c)
+            if c == a or c == b or d == a:
+                continue
+            gain = dist[a, b] + dist[c, d] - dist[a, c] - dist[b, d]
+            if gain > EPSILON:
+                idle_counter = 0
+                tour.reverse(b, c)
+                distance -= gain
+                self.moves_applied += 1
+            else:
+                idle_counter += 1
+            total_counter += 1
+        self.moves_evaluated += total_counter
+        solution['tour'] = tour.to_list()
+        solution['distance'] = distance
+        return solution
+
+    def local_search_alt_batch(self, solution, idle_limit):
+        """local_search_alt drawing alt_batch random 2-opt moves at once and
+        scoring them with one fancy-indexed lookup into the distance matrix.
+        The best (alt_pick 'best') or the first improving move of a batch is
+        applied, the search stops after idle_limit batches in a row without
+        an improving move. Always uses an ArrayTour for its numpy views."""
+        tour = ArrayTour(solution['tour'])
+        order = tour.order_view
+        distance = solution['distance']
+        dist = self.dist_matrix
+        n = len(tour)
+        batch = self.alt_batch
+        idle_counter = 0
+        total_counter = 0
+
+        while idle_counter < idle_limit and not self.should_stop():
+            i = numpy.random.randint(0, n, batch)
+            j = numpy.random.randint(0, n, batch)
+            # move (i, j) replaces the edges behind positions low and high
+            low, high = numpy.minimum(i, j), numpy.maximum(i, j)
+            valid = (high - low >= 2) & ((low > 0) | (high < n - 1))
+            low, high = low[valid], high[valid]
+            a, b = order[low], order[low + 1]
+            c, d = order[high], order[(high + 1) % n]
+            gains = (dist[a, b].astype(numpy.int64) + dist[c, d] - dist[a, c] - dist[b, d])
+            total_counter += len(gains)
+            if self.alt_pick == 'best':
+                best = gains.argmax() if len(gains) else None
+                found = best is not None and gains[best] > EPSILON
+            else:
+                improving = numpy.flatnonzero(gains > EPSILON)
+                found = len(improving) > 0
+                best = improving[0] if found else None
+            if found:
+                idle_counter = 0
+                tour.reverse(b[best], c[best])
+                distance -= gains[best].item()
+                self.moves_applied += 1
+            else:
+                idle_counter += 1
+        self.moves_evaluated += total_counter
+        solution['tour'] = tour.to_list()
+        solution['distance'] = distance
+        return solution
+
+    def make_tour(self, cities):
+        return make_tour(cities, self.tour_type)
+
+    def reverse_segment(self, tour, i, j):
+        """Reverse tour[i..j] in place"""
+        tour[i:j + 1] = tour[i:j + 1][::-1]
+
+    def perturbation(self, solution):
+        """Double bridge kick, over the whole tour or localized (kick 'local').
+        The new distance is the old one plus the delta of the 4 exchanged
+        edges and the kick reports the 8 touched endpoints."""
+        tour = solution['tour']
+        n = len(tour)
+        if self.kick == 'local' and n >= 8:
+            tour, positions = self.local_bridge_positions(tour)
+        else:
+            positions = self.double_bridge_positions(n)
+        new_solution = {}
+        new_solution['tour'] = self.double_bridge_move(tour, positions)
+        pos1, pos2, pos3 = positions
+        if pos3 >= n:
+            # tiny instances, segment d is empty
+            new_solution['distance'] = self.calculate_tour_distance(new_solution['tour'])
+            return new_solution
+        dist = self.dist_matrix
+        # ends of the segments a, b, c, d
+        a1, a2 = tour[0], tour[pos1 - 1]
+        b1, b2 = tour[pos1], tour[pos2 - 1]
+        c1, c2 = tour[pos2], tour[pos3 - 1]
+        d1, d2 = tour[pos3], tour[n - 1]
+        removed = dist[a2, b1] + dist[b2, c1] + dist[c2, d1] + dist[d2, a1]
+        added = dist[a2, d1] + dist[d2, c1] + dist[c2, b1] + dist[b2, a1]
+        new_solution['distance'] = solution['distance'] + added - removed
+        new_solution['touched'] = [a1, a2, b1, b2, c1, c2, d1, d2]
+        if 'key' in solution:
+            edge = self.hasher.edge
+            new_solution['key'] = solution['key'] ^ edge(a2, b1) ^ edge(b2, c1) ^ edge(c2, d1) ^ edge(d2, a1) \
+                ^ edge(a2, d1) ^ edge(d2, c1) ^ edge(c2, b1) ^ edge(b2, a1)
+        return new_solution
+
+    def double_bridge_positions(self, n):
+        pos1 = 1 + random.randint(0, n / 4)
+        pos2 = pos1 + 1 + random.randint(0, n / 4)
+        pos3 = pos2 + 1 + random.randint(0, n / 4)
+        return pos1, pos2, pos3
+
+    def local_bridge_positions(self, tour):
+        """Cut the tour before a random city and 3 of its kick_strength nearest
+        neighbors. Returns the tour rotated to start at the first cut and the
+        other 3 cuts as positions for double_bridge_move."""
+        city = random.randrange(len(tour))
+        near = self.kick_neighbors[city][:self.kick_strength.strength]
+        cuts = sorted(tour.index(c) for c in [city] + random.sample(near, 3))
+        first = cuts[0]
+        return tour[first:] + tour[:first], tuple(cut - first for cut in cuts[1:])
+
+    def double_bridge_move(self, tour, positions=None):
+        """Split tour in 4 and reorder them.
+        (a,b,c,d) --> (a,d,c,b)
+        Source: https://www.comp.nus.edu.sg/~stevenha/database/viz/TSP_ILS.cpp"""
+        pos1, pos2, pos3 = positions or self.double_bridge_positions(len(tour))
+        return tour[0:pos1] + tour[pos3:] + tour[pos2:pos3] + tour[pos1:pos2]
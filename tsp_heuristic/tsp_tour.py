@@ -0,0 +1,248 @@
+# -*- coding: utf-8 -*-
+
+import math
+from array import array
+import numpy
+
+TOUR_TYPES = ('auto', 'array', 'two_level')
+# 'auto' switches to the two-level list above this many cities
+TWO_LEVEL_LIMIT = 100000
+# reversals up to this length are swapped element by element
+SHORT_REVERSAL = 32
+
+
+def make_tour(cities, tour_type='auto'):
+    if tour_type == 'auto':
+        tour_type = 'two_level' if len(cities) > TWO_LEVEL_LIMIT else 'array'
+    if tour_type == 'array':
+        return ArrayTour(cities)
+    elif tour_type == 'two_level':
+        return TwoLevelTour(cities)
+    raise ValueError("Unknown tour type '{0}', use one of {1}".format(tour_type, TOUR_TYPES))
+
+
+class ArrayTour(object):
+    """City order as int32 array plus the inverse position array.
+    Both are array.array('i') for fast element access from Python, with
+    numpy views on the same memory for bulk operations."""
+
+    def __init__(self, cities):
+        self.order = array('i', cities)
+        self.n = len(self.order)
+        self.order_view = numpy.frombuffer(self.order, dtype=numpy.int32)
+        positions = numpy.empty(self.n, dtype=numpy.int32)
+        positions[self.order_view] = numpy.arange(self.n, dtype=numpy.int32)
+        self.pos = array('i')
+        self.pos.fromstring(positions.tostring())
+        self.pos_view = numpy.frombuffer(self.pos, dtype=numpy.int32)
+
+    def __len__(self):
+        return self.n
+
+    def __iter__(self):
+        return iter(self.order)
+
+    def to_list(self):
+        return self.order.tolist()
+
+    def next(self, city):
+        i = self.pos[city] + 1
+        return self.order[i if i < self.n else 0]
+
+    def prev(self, city):
+        return self.order[self.pos[city] - 1]
+
+    def position(self, city):
+        return self.pos[city]
+
+    def between(self, a, b, c):
+        """True if b lies on the forward path from a to c"""
+        pa, pb, pc = self.pos[a], self.pos[b], self.pos[c]
+        if pa <= pc:
+            return pa <= pb <= pc
+        return pb >= pa or pb <= pc
+
+    def reverse(self, a, b):
+        """Reverse the forward path from city a to city b in place.
+        The complement is reversed instead if it is shorter, which gives
+        the same cycle in opposite direction."""
+        n = self.n
+        i, j = self.pos[a], self.pos[b]
+        length = (j - i) % n + 1
+        if 2 * length > n:
+            i, j = (j + 1) % n, (i - 1) % n
+            length = n - length
+        if length > SHORT_REVERSAL and i <= j:
+            segment = self.order_view[i:j + 1]
+            segment[:] = segment[::-1].copy()
+            self.pos_view[segment] = numpy.arange(i, j + 1, dtype=numpy.int32)
+            return
+        order, pos = self.order, self.pos
+        for _ in xrange(length // 2):
+            ci, cj = order[j], order[i]
+            order[i], order[j] = ci, cj
+            pos[ci], pos[cj] = i, j
+            i += 1
+            if i == n:
+                i = 0
+            j -= 1
+            if j < 0:
+                j = n - 1
+
+
+class Segment(object):
+    __slots__ = ('cities', 'reversed', 'rank', 'start', 'next', 'prev')
+
+    def __init__(self, cities):
+        self.cities = cities
+        self.reversed = False
+        self.rank = 0
+        self.start = 0
+        self.next = None
+        self.prev = None
+
+    def first(self):
+        return self.cities[-1] if self.reversed else self.cities[0]
+
+    def last(self):
+        return self.cities[0] if self.reversed else self.cities[-1]
+
+
+class TwoLevelTour(object):
+    """Two-level doubly-linked list: the tour is split into about sqrt(n)
+    segments, each with a reversal bit. Reversing a path splits at most two
+    segments and then flips whole segments, so it costs O(sqrt(n))."""
+
+    def __init__(self, cities, segment_size=None):
+        self.n = len(cities)
+        self.segment_size = segment_size or max(8, int(math.sqrt(self.n)))
+        self.build(list(cities))
+
+    def build(self, cities):
+        n = self.n
+        self.segment_of = [None] * n
+        self.index = [0] * n
+        segments = [Segment(cities[start:start + self.segment_size])
+                    for start in xrange(0, n, self.segment_size)]
+        for k, segment in enumerate(segments):
+            segment.next = segments[(k + 1) % len(segments)]
+            segment.prev = segments[k - 1]
+            self.assign(segment)
+        self.head = segments[0]
+        self.count = len(segments)
+        self.renumber()
+
+    def assign(self, segment):
+        segment_of, index = self.segment_of, self.index
+        for i, city in enumerate(segment.cities):
+            segment_of[city] = segment
+            index[city] = i
+
+    def renumber(self):
+        segment = self.head
+        start = 0
+        for rank in xrange(self.count):
+            segment.rank = rank
+            segment.start = start
+            start += len(segment.cities)
+            segment = segment.next
+
+    def __len__(self):
+        return self.n
+
+    def __iter__(self):
+        return iter(self.to_list())
+
+    def to_list(self):
+        cities = []
+        segment = self.head
+        for _ in xrange(self.count):
+            cities.extend(reversed(segment.cities) if segment.reversed else segment.cities)
+            segment = segment.next
+        return cities
+
+    def next(self, city):
+        segment = self.segment_of[city]
+        i = self.index[city]
+        if segment.reversed:
+            return segment.cities[i - 1] if i > 0 else segment.next.first()
+        return segment.cities[i + 1] if i + 1 < len(segment.cities) else segment.next.first()
+
+    def prev(self, city):
+        segment = self.segment_of[city]
+        i = self.index[city]
+        if segment.reversed:
+            return segment.cities[i + 1] if i + 1 < len(segment.cities) else segment.prev.last()
+        return segment.cities[i - 1] if i > 0 else segment.prev.last()
+
+    def position(self, city):
+        segment = self.segment_of[city]
+        i = self.index[city]
+        return segment.start + (len(segment.cities) - 1 - i if segment.reversed else i)
+
+    def between(self, a, b, c):
+        """True if b lies on the forward path from a to c"""
+        pa, pb, pc = self.position(a), self.position(b), self.position(c)
+        if pa <= pc:
+            return pa <= pb <= pc
+        return pb >= pa or pb <= pc
+
+    def split_before(self, city):
+        """make city the first city of its segment"""
+        segment = self.segment_of[city]
+        if segment.first() == city:
+            return
+        i = self.index[city]
+        if segment.reversed:
+            # forward order is cities[-1] ... cities[0]
+            tail = Segment(segment.cities[:i + 1])
+            segment.cities = segment.cities[i + 1:]
+            tail.reversed = True
+            self.assign(segment)
+        else:
+            tail = Segment(segment.cities[i:])
+            segment.cities = segment.cities[:i]
+        self.assign(tail)
+        tail.prev, tail.next = segment, segment.next
+        segment.next.prev = tail
+        segment.next = tail
+        self.count += 1
+
+    def reverse(self, a, b):
+        """Reverse the forward path from city a to city b in place.
+        The complement is reversed instead if it is shorter, which gives
+        the same cycle in opposite direction."""
+        n = self.n
+        length = (self.position(b) - self.position(a)) % n + 1
+        if 2 * length > n:
+            a, b = self.next(b), self.prev(a)
+            length = n - length
+        if length < 2:
+            return
+        first, last = self.segment_of[a], self.segment_of[b]
+        if first is last and self.position(a) <= self.position(b):
+            # inside one segment, reverse the stored slice
+            i, j = sorted((self.index[a], self.index[b]))
+            first.cities[i:j + 1] = first.cities[i:j + 1][::-1]
+            for k in xrange(i, j + 1):
+                self.index[first.cities[k]] = k
+            return
+
+        self.split_before(a)
+        self.split_before(self.next(b))
+        first, last = self.segment_of[a], self.segment_of[b]
+        before, after = first.prev, last.next
+        segment = first
+        while True:
+            following = segment.next
+            segment.reversed = not segment.reversed
+            segment.next, segment.prev = segment.prev, segment.next
+            if segment is last:
+                break
+            segment = following
+        before.next, last.prev = last, before
+        first.next, after.prev = after, first
+        if self.count > 2 * (n // self.segment_size + 1):
+            self.build(self.to_list())
+        else:
+            self.renumber()
@@ -11,9 +11,9 @@ from PyQt4 import QtCore, QtGui
 from PyQt4.QtCore import SIGNAL
 from matplotlib.backends.backend_qt4agg import FigureCanvasQTAgg as FigureCanvas
 import matplotlib.pyplot as plt
-import networkx as nx
 
 from tsp_worker import Problem
+from tsp_render import TourRenderer
 
 ROOT_DIR = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
 PROBLEMS_DIR = os.path.join(ROOT_DIR, 'problems')
@@ -144,6 +144,11 @@ class Ui_Tsp(QtGui.QWidget):
         self.runTsp_btn.setSizePolicy(sizePolicy)
         self.runTsp_btn.setObjectName(_fromUtf8("runTsp_btn"))
         self.gridLayout_4.addWidget(self.runTsp_btn, 0, 9, 1, 1)
+        self.stopTsp_btn = QtGui.QPushButton(self.widget)
+        self.stopTsp_btn.setSizePolicy(sizePolicy)
+        self.stopTsp_btn.setObjectName(_fromUtf8("stopTsp_btn"))
+        self.stopTsp_btn.setEnabled(False)
+        self.gridLayout_4.addWidget(self.stopTsp_btn, 0, 10, 1, 1)
         self.verticalLayout_4.addLayout(self.gridLayout_4)
         self.line = QtGui.QFrame(self.widget)
         self.line.setFrameShape(QtGui.QFrame.HLine)
@@ -230,6 +235,7 @@ class Ui_Tsp(QtGui.QWidget):
         self.figure = plt.figure()
         self.canvas = FigureCanvas(self.figure)
         self.canvas.setSizePolicy(sizePolicy)
+        self.renderer = TourRenderer(self.figure, self.canvas)
         self.horizontalLayout_2.addWidget(self.canvas)
         self.solutionList = QtGui.QListWidget(self.widget_2)
         sizePolicy = QtGui.QSizePolicy(QtGui.QSizePolicy.Expanding, QtGui.QSizePolicy.Expanding)
@@ -251,6 +257,7 @@ class Ui_Tsp(QtGui.QWidget):
         TSP.setWindowTitle(_translate("TSP", "Python TSP Heuristic", None))
         self.iterationLabel.setText(_translate("TSP", "Set iteration limit:", None))
         self.runTsp_btn.setText(_translate("TSP", "Run!", None))
+        self.stopTsp_btn.setText(_translate("TSP", "Stop", None))
         self.infoLabel.setText(_translate("TSP", "Info:", None))
         self.runtimeLabel.setText(_translate("TSP", "Runtime:", None))
         self.iterLabel.setText(_translate("TSP", "Iterations:", None))
@@ -260,6 +267,7 @@ class Ui_Tsp(QtGui.QWidget):
         self.problem_changed()
 
         self.runTsp_btn.clicked.connect(self.run_tsp)
+        self.stopTsp_btn.clicked.connect(self.stop_tsp)
         self.fileComboBox.currentIndexChanged.connect(self.problem_changed)
         self.solutionList.currentItemChanged.connect(self.solution_changed)
 
@@ -273,6 +281,7 @@ class Ui_Tsp(QtGui.QWidget):
                 self.problem = Problem(file_path)
                 self.connect(self.problem, SIGNAL("finished()"), self.done)
                 self.connect(self.problem, SIGNAL("iter"), self.update_info)
+                self.connect(self.problem, SIGNAL("best"), self.show_best)
                 self.infoText.setText("ready...")
             except Exception as e:
                 print e
@@ -282,9 +291,13 @@ class Ui_Tsp(QtGui.QWidget):
         if self.problem and self.problem.isRunning():
                 QtGui.QMessageBox.information(self, "Warning!", "Solver is still running!", QtGui.QMessageBox.Ok)
         selected = self.solutionList.currentIndex().row()
-        if selected < len(self.problem.solutions):
-            solution = self.problem.solutions[selected]['tour']
-            self.draw_solution(solution)
+        if selected < len(self.problem.history):
+            tour = self.problem.history.tour(selected)
+            if tour is None:
+                self.infoText.setText("Tour of iteration {0} was not archived".format(selected + 1))
+            else:
+                self.infoText.setText("Tour-Distance: " + str(self.problem.history.distance[selected]))
+                self.draw_solution(tour)
 
     def run_tsp(self):
         self.problem.setParameters(self.iterationBox.value(), self.radio_alt.isChecked(), self.noimproveBox.value())
@@ -294,54 +307,64 @@ class Ui_Tsp(QtGui.QWidget):
         self.iterText.repaint()
         self.runtimeText.setText("")
         self.runtimeText.repaint()
+        self.stopTsp_btn.setEnabled(True)
         self.problem.start()
 
+    def stop_tsp(self):
+        # the solver finishes its current step and keeps the best tour found
+        self.problem.cancel()
+        self.stopTsp_btn.setEnabled(False)
+
     def done(self):
+        self.stopTsp_btn.setEnabled(False)
         try:
             self.runtimeText.setText(str(self.problem.runtime) + " (best after " + str(self.problem.best_solution['runtime']) + ")")
             self.iterText.setText(str(self.problem.iterations) + " (best at " + str(self.problem.best_solution['iteration']) + ")")
             self.infoText.setText("Tour-Distance: " + str(self.problem.best_solution['distance']))
-            self.write_list(self.problem.solutions)
+            self.write_list(self.problem.history)
             self.draw_solution(self.problem.best_solution['tour'])
+            if self.problem.run_start is not None:
+                with self.problem.profiler.phase('logging'):
+                    self.problem.store_run(self.problem.run_start)
+                self.problem.run_start = None
         except:
             self.infoText.setText("Error occured while running... :(")
 
     def update_info(self, iterations):
-        self.infoText.setText("Solving TSP '{0}': {1}/{2}".format(self.problem.meta['name'], iterations, self.problem.iteration_limit))
+        stats = self.problem.stats
+        self.infoText.setText("Solving TSP '{0}': {1}/{2} ({3:.0f} moves/s), best {4}".format(
+            self.problem.meta['name'], iterations, self.problem.iteration_limit,
+            stats['moves_evaluated'] / stats['elapsed'] if stats['elapsed'] else 0,
+            '-' if self.problem.published is None else self.problem.published))
         self.infoText.repaint()
 
-    def draw_solution(self, tour):
-        edges = self.problem.get_edge_list(tour)
-
-        ax = self.figure.add_subplot(111)
-        ax.hold(False)
-        G = nx.DiGraph()
-        G.add_nodes_from(range(0, len(self.problem.data)))
-        G.add_edges_from(edges)
-        nx.draw_networkx_nodes(G, self.problem.data, node_size=20, node_color='k')
-        nx.draw_networkx_edges(G, self.problem.data, width=0.5, arrows=True, edge_color='r')
-
-        self.figure.tight_layout(pad=1.2)
-        plt.title(self.problem.meta['name'])
-        plt.xlim(0)
-        plt.ylim(0)
-        plt.xlabel('X-Axis')
-        plt.ylabel('Y-Axis')
-        plt.savefig(self.problem.img)
-        self.canvas.draw()
-
-    def write_list(self, solutions):
+    def show_best(self, tour, distance):
+        """improved best tour streamed while the solver runs"""
+        self.draw_solution(tour, export=False)
+
+    def draw_solution(self, tour, export=True):
+        with self.problem.profiler.phase('drawing'):
+            self.plot_solution(tour, export)
+
+    def plot_solution(self, tour, export=True):
+        self.renderer.draw(self.problem.data, tour, self.problem.meta['name'],
+                           self.problem.img if export else None)
+
+    def write_list(self, history):
         self.solutionList.clear()
         gold = QtGui.QBrush(QtGui.QColor(255, 191, 0))
         gold.setStyle(QtCore.Qt.SolidPattern)
+        # iterations whose tour was dropped from the history
+        grey = QtGui.QBrush(QtGui.QColor(160, 160, 160))
 
-        for i in range(0, len(solutions)):
+        for i, distance in enumerate(history.distances().tolist()):
             item = QtGui.QListWidgetItem()
-            distance = solutions[i]['distance']
             item.setText("{0}:  {1}".format(str(i+1), str(distance)))
             if i > 0:
                 if distance == self.problem.best_solution['distance']:
                     item.setBackground(gold)
+            if not history.is_archived(i):
+                item.setForeground(grey)
 
             self.solutionList.addItem(item)
 